@@ -20,11 +20,40 @@ included weather information.
 # with this program; if not, write to the Free Software Foundation, Inc.,
 # 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA."""
 #
+import asyncio
+import base64
+import bisect
+import calendar
+import collections
+import concurrent.futures
+import hashlib
+import heapq
+import http.client
+import io
+import math
+import mmap
+import os
+import random
 import re
+import socket
+import ssl
+import struct
+import sys
+import tarfile
+import threading
+import time
+import zlib
 
 import urllib.request  # noqa: E402
 import urllib.error    # noqa: E402
 import urllib.parse    # noqa: E402
+from array import array
+
+try:
+    import numpy
+except ImportError:
+    # ReportBatch falls back to array and plain loops
+    numpy = None
 
 __author__ = "klausman-pymetar@schwarzvogel.de"
 
@@ -345,6 +374,51 @@ _WEATHER_CONDITIONS = {
            }),
 }
 
+
+def _describe_condition(wcond):
+    """
+    Return the (description, pixmap) tuple for a weather group (e.g.
+    "-SHRA") or None, looked up in _WEATHER_CONDITIONS. Note that the
+    intensity of a group with a qualifier is not taken into account.
+    """
+    if len(wcond) > 3 and wcond.startswith(('+', '-')):
+        wcond = wcond[1:]
+
+    if wcond.startswith(('+', '-')):
+        pphen = 1
+    elif len(wcond) < 4:
+        pphen = 0
+    else:
+        pphen = 2
+    squal = wcond[:pphen]
+    sphen = wcond[pphen: pphen + 4]
+    phenomenon = _WEATHER_CONDITIONS.get(sphen, None)
+    if phenomenon is not None:
+        (name, pixmap, phenomenon) = phenomenon
+        pheninfo = phenomenon.get(squal, name)
+        if not isinstance(pheninfo, type(())):
+            return (pheninfo, pixmap)
+        else:
+            # contains pixmap info
+            return pheninfo
+
+
+# All weather groups matched by COND_RE_STR, mapped to their
+# (description, pixmap) tuple, so that a group is described by a single
+# lookup.
+_CONDITIONS = {}
+for _intensity in ("", "-", "+"):
+    for _qualifier in ("", "VC", "MI", "BC", "PR", "TS", "BL", "SH", "DR",
+                       "FZ"):
+        for _phenomenon in ("DZ", "RA", "SN", "SG", "IC", "PE", "GR", "GS",
+                            "UP", "BR", "FG", "FU", "VA", "SA", "HZ", "PY",
+                            "DU", "SQ", "SS", "DS", "PO", "FC", "+FC"):
+            _group = _intensity + _qualifier + _phenomenon
+            _condition = _describe_condition(_group)
+            if _condition is not None:
+                _CONDITIONS[_group] = _condition
+del _intensity, _qualifier, _phenomenon, _group, _condition
+
 CLOUDTYPES = {
     "ACC": "altocumulus castellanus",
     "ACSL": "standing lenticular altocumulus",
@@ -358,6 +432,86 @@ CLOUDTYPES = {
 }
 
 
+# Groups of the encoded report, tried in this order. The names are the
+# kinds reported by tokenize_metar().
+_GROUP_RE = re.compile("|".join("(?P<%s>%s)" % group for group in (
+    ("time", r"^[0-9]{6}Z$"),
+    ("modifier", r"^(AUTO|COR|NIL|CC[A-Z])$"),
+    ("wind", r"^(VRB|[0-9]{3}|///)([0-9]{2,3}|//)(G[0-9]{2,3})?"
+             r"(KT|MPS|KMH)$"),
+    ("windvar", r"^[0-9]{3}V[0-9]{3}$"),
+    ("cloud", CLOUD_RE_STR),
+    ("visibility", r"^([0-9]{4}(NDV|[NSEW]{1,2})?|M?[0-9]+SM|"
+                   r"M?[0-9]/[0-9]{1,2}SM|P6SM)$"),
+    ("rvr", r"^R[0-9]{2}[LCR]?/"),
+    ("weather", COND_RE_STR),
+    ("temperature", r"^M?[0-9]{2}/(M?[0-9]{2})?$"),
+    ("altimeter", r"^[QA][0-9]{4}$"),
+    ("trend", r"^(NOSIG|BECMG|TEMPO)$"),
+)))
+_FRACTION_RE = re.compile(r"^[0-9]/[0-9]{1,2}SM$")
+
+
+# Kinds of the groups seen so far, most groups (e.g. "9999", "NOSIG")
+# occur in many reports.
+_GROUP_KINDS = {}
+_GROUP_KINDS_MAX = 20000
+
+
+def _group_kind(group):
+    """Classify a single group of an encoded report, see tokenize_metar()"""
+    match = _GROUP_RE.match(group)
+    kind = match.lastgroup if match is not None else "other"
+    if len(_GROUP_KINDS) < _GROUP_KINDS_MAX:
+        _GROUP_KINDS[group] = kind
+    return kind
+
+
+def tokenize_metar(code):
+    """
+    Split an encoded METAR report into its groups and classify each of
+    them in a single pass. Return a list of (kind, group) tuples, kind
+    is one of "type" (METAR/SPECI), "station", "time", "modifier",
+    "wind", "windvar", "visibility", "rvr", "weather", "cloud",
+    "temperature", "altimeter", "trend", "remark" or "other".
+    Everything from RMK on is a remark, except for groups that look
+    like clouds or weather: those have always been taken into account.
+    """
+    if not code:
+        return []
+    groups = code.split()
+    tokens = []
+    if groups[0] in ("METAR", "SPECI"):
+        tokens.append(("type", groups.pop(0)))
+        if not groups:
+            return tokens
+    tokens.append(("station", groups[0]))
+    kinds = _GROUP_KINDS
+
+    if "RMK" in groups:
+        rmk = groups.index("RMK")
+        tokens.extend([(kinds.get(group) or _group_kind(group), group)
+                       for group in groups[1:rmk]])
+        tokens.append(("remark", "RMK"))
+        for group in groups[rmk + 1:]:
+            kind = kinds.get(group) or _group_kind(group)
+            if kind not in ("cloud", "weather"):
+                kind = "remark"
+            tokens.append((kind, group))
+    else:
+        tokens.extend([(kinds.get(group) or _group_kind(group), group)
+                       for group in groups[1:]])
+
+    if "SM" in code:
+        # The whole miles of e.g. "1 1/2SM"
+        for index in range(1, len(tokens) - 1):
+            (kind, group) = tokens[index]
+            if kind == "other" and len(group) == 1 and group.isdigit() \
+                    and _FRACTION_RE.match(tokens[index + 1][1]):
+                tokens[index] = ("visibility", group)
+    return tokens
+
+
 def metar_to_iso8601(metardate):
     """Convert a metar date to an ISO8601 date."""
     if metardate is not None:
@@ -368,6 +522,18 @@ def metar_to_iso8601(metardate):
                 (year, month, day, hour[:2], hour[2:4]))
 
 
+def metar_to_epoch(metardate):
+    """
+    Convert a metar date (YYYY.MM.DD HHMM UTC) to seconds since the
+    epoch.
+    """
+    if metardate is not None:
+        (date, hour) = metardate.split()[:2]
+        (year, month, day) = date.split('.')
+        return calendar.timegm((int(year), int(month), int(day),
+                                int(hour[:2]), int(hour[2:4]), 0))
+
+
 def _parse_lat_long(latlong):
     """
     Parse Lat or Long in METAR notation into float values. N and E
@@ -403,55 +569,12 @@ def _parse_lat_long(latlong):
     return coords
 
 
-class WeatherReport:
-    """Incorporates both the unparsed textual representation of the
-    weather report and the parsed values as soon as they are filled
-    in by ReportParser."""
+class _ReportGetters:
 
-    def _clearallfields(self):
-        """Clear all fields values."""
-        # until finished, report is invalid
-        self.valid = 0
-        # Clear all
-        self.givenstationid = None
-        self.fullreport = None
-        self.temp = None
-        self.tempf = None
-        self.windspeed = None
-        self.windspeedmph = None
-        self.winddir = None
-        self.vis = None
-        self.dewp = None
-        self.dewpf = None
-        self.humid = None
-        self.press = None
-        self.pressmmHg = None
-        self.code = None
-        self.weather = None
-        self.sky = None
-        self.fulln = None
-        self.cycle = None
-        self.windcomp = None
-        self.rtime = None
-        self.pixmap = None
-        self.latitude = None
-        self.longitude = None
-        self.altitude = None
-        self.stat_city = None
-        self.stat_country = None
-        self.reporturl = None
-        self.latf = None
-        self.longf = None
-        self.cloudinfo = None
-        self.conditions = None
-        self.w_chill = None
-        self.w_chillf = None
-        self.cloudtype = None
+    """The accessors shared by WeatherReport and CompactWeatherReport."""
 
-    def __init__(self, MetarStationCode=None):
-        """Clear all fields and fill in wanted station id."""
-        self._clearallfields()
-        self.givenstationid = MetarStationCode
+    # No per instance dict for subclasses with slots
+    __slots__ = ()
 
     def getFullReport(self):
         """ Return the complete weather report.  """
@@ -508,6 +631,21 @@ class WeatherReport:
         if self.windspeed is not None:
             return self.windspeed * 1.94384449
 
+    def getWindGust(self):
+        """
+        Return the speed of wind gusts in meters per second (only for
+        reports parsed with RawReportParser).
+        """
+        return self.windgust
+
+    def getWindDirectionRange(self):
+        """
+        Return the range the wind direction varies in as a tuple of
+        degrees (from, to), or None (only for reports parsed with
+        RawReportParser).
+        """
+        return self.windvar
+
     def getWindDirection(self):
         """
         Return wind direction in degrees.
@@ -748,313 +886,1871 @@ class WeatherReport:
         """
         return self.cloudtype
 
+    def getTokens(self):
+        """
+        Return the groups of the encoded report as a list of (kind, group)
+        tuples, see tokenize_metar().
+        """
+        return self.tokens
 
-class ReportParser:
-
-    """Parse raw METAR data from a WeatherReport object into actual
-    values and return the object with the values filled in."""
 
-    def __init__(self, MetarReport=None):
-        """Set attribute Report as specified on instantation."""
-        self.Report = MetarReport
+class WeatherReport(_ReportGetters):
+    """Incorporates both the unparsed textual representation of the
+    weather report and the parsed values as soon as they are filled
+    in by ReportParser."""
 
-    def extractCloudInformation(self):
+    def _clearallfields(self):
+        """Clear all fields values."""
+        # until finished, report is invalid
+        self.valid = 0
+        # Clear all
+        self.givenstationid = None
+        self.fullreport = None
+        self.temp = None
+        self.tempf = None
+        self.windspeed = None
+        self.windspeedmph = None
+        self.winddir = None
+        self.vis = None
+        self.dewp = None
+        self.dewpf = None
+        self.humid = None
+        self.press = None
+        self.pressmmHg = None
+        self.code = None
+        self.weather = None
+        self.sky = None
+        self.fulln = None
+        self.cycle = None
+        self.windcomp = None
+        self.rtime = None
+        self.pixmap = None
+        self.latitude = None
+        self.longitude = None
+        self.altitude = None
+        self.stat_city = None
+        self.stat_country = None
+        self.reporturl = None
+        self.latf = None
+        self.longf = None
+        self.cloudinfo = None
+        self.conditions = None
+        self.w_chill = None
+        self.w_chillf = None
+        self.cloudtype = None
+        self.tokens = None
+        self.windgust = None
+        self.windvar = None
+        # Text, offset of the lines with headers and handlers not run
+        # yet of a report parsed by a lazy ReportParser
+        self._lazy = None
+
+    def __getattr__(self, name):
         """
-        Extract cloud information. Return None or a tuple (sky type as a
-        string of text, cloud type (if any)  and suggested pixmap name)
+        Parse the values of a lazily parsed report on first access, see
+        ReportParser.
         """
-        matches = self.match_WeatherPart(CLOUD_RE_STR)
-        skytype = None
-        ctype = None
-        pixmap = None
-        for wcloud in matches:
-            if wcloud is not None:
-                stype = wcloud[:3]
-                if stype in ("CLR", "SKC", "CAV", "NSC"):
-                    skytype = "Clear sky"
-                    pixmap = "sun"
-                elif stype == "BKN":
-                    skytype = "Broken clouds"
-                    pixmap = "suncloud"
-                elif stype == "SCT":
-                    skytype = "Scattered clouds"
-                    pixmap = "suncloud"
-                elif stype == "FEW":
-                    skytype = "Few clouds"
-                    pixmap = "suncloud"
-                elif stype == "OVC":
-                    skytype = "Overcast"
-                    pixmap = "cloud"
-                if ctype is None:
-                    ctype = CLOUDTYPES.get(wcloud[6:], None)
-
-        return (skytype, ctype, pixmap)
-
-    def extractSkyConditions(self):
+        lazy = self.__dict__.get("_lazy")
+        if lazy is not None and name in _FIELD_HEADERS:
+            (text, body, pending) = lazy
+            attributes = self.__dict__
+            # Other threads wait until the values are filled in
+            with _LAZY_LOCK:
+                for header in _FIELD_HEADERS[name]:
+                    if header not in pending:
+                        continue
+                    handler = pending.pop(header)
+                    # Values the line does not set remain None, unless
+                    # another line still to be parsed may set them
+                    for field in _HEADER_FIELDS[header]:
+                        if field in attributes:
+                            continue
+                        for other in _FIELD_HEADERS[field]:
+                            if other in pending:
+                                break
+                        else:
+                            attributes[field] = None
+                    data = _find_line(text, body, header)
+                    if data is not None and handler is not None:
+                        handler(self, data)
+                    if header == "ob":
+                        ReportParser(self)._completeReport()
+                return attributes.get(name)
+        raise AttributeError("%r object has no attribute %r" %
+                             (type(self).__name__, name))
+
+    def __copy__(self):
         """
-        Extract sky condition information from the encoded report. Return
-        a tuple containing the description of the sky conditions as a
-        string and a suggested pixmap name for an icon representing said
-        sky condition.
+        Return a shallow copy. A lazily parsed report and its copy parse
+        their values on their own.
         """
-        matches = self.match_WeatherPart(COND_RE_STR)
-        for wcond in matches:
-            if len(wcond) > 3 and wcond.startswith(('+', '-')):
-                wcond = wcond[1:]
+        clone = type(self).__new__(type(self))
+        with _LAZY_LOCK:
+            clone.__dict__.update(self.__dict__)
+            lazy = self.__dict__.get("_lazy")
+            if lazy is not None:
+                (text, body, pending) = lazy
+                clone._lazy = (text, body, dict(pending))
+        return clone
 
-            if wcond.startswith(('+', '-')):
-                pphen = 1
-            elif len(wcond) < 4:
-                pphen = 0
-            else:
-                pphen = 2
-            squal = wcond[:pphen]
-            sphen = wcond[pphen: pphen + 4]
-            phenomenon = _WEATHER_CONDITIONS.get(sphen, None)
-            if phenomenon is not None:
-                (name, pixmap, phenomenon) = phenomenon
-                pheninfo = phenomenon.get(squal, name)
-                if not isinstance(pheninfo, type(())):
-                    return (pheninfo, pixmap)
-                else:
-                    # contains pixmap info
-                    return pheninfo
+    def __init__(self, MetarStationCode=None):
+        """Clear all fields and fill in wanted station id."""
+        self._clearallfields()
+        self.givenstationid = MetarStationCode
 
-    def match_WeatherPart(self, regexp):
-        """
-        Return the matching part of the encoded Metar report.
-        regexp: the regexp needed to extract this part.
-        Return the first matching string or None.
-        WARNING: Some Metar reports may contain several matching
-        strings, only the first one is taken into account!
-        """
-        matches = []
-        # FIXME This mixes direct access to the "code" attribute and the accessor function "getRawMetarCode" which just returns "code".
-        if self.Report.code is not None:
-            myre = re.compile(regexp)
-            for wpart in self.Report.getRawMetarCode().split():
-                match = myre.match(wpart)
-                if match:
-                    matches.append(match.group())
-        return matches
 
-    def ParseReport(self, MetarReport=None):
-        """Take report with raw info only and return it with in
-        parsed values filled in. Note: This function edits the
-        WeatherReport object you supply!"""
-        if self.Report is None and MetarReport is None:
-            raise EmptyReportException(
-                "No report given on init and ParseReport().")
-        elif MetarReport is not None:
-            self.Report = MetarReport
+class CompactWeatherReport(_ReportGetters):
 
-        try:
-            lines = self.Report.fullreport.decode().split("\n")
-        except UnicodeDecodeError:
-            raise GarbledReportException(
-                "Report is not valid ASCII or Unicode.")
+    """A parsed weather report with the same accessors as WeatherReport,
+    but using __slots__ instead of a __dict__ per report, to keep many
+    reports in memory. Create one from a parsed WeatherReport with
+    FromReport(). The tokens are not kept, getTokens() splits the
+    encoded report again."""
 
-        for line in lines:
-            try:
-                header, data = line.split(":", 1)
-            except ValueError:
-                header = data = line
-
-            header = header.strip()
-            data = data.strip()
-
-            # The station id inside the report
-            # As the station line may contain additional sets of (),
-            # we have to search from the rear end and flip things around
-            if header.find("(" + self.Report.givenstationid + ")") != -1:
-                id_offset = header.find("(" + self.Report.givenstationid + ")")
-                loc = data[:id_offset]
-                coords = data[id_offset:]
-                try:
-                    loc = loc.strip()
-                    rloc = loc[::-1]
-                    rcoun, rcity = rloc.split(",", 1)
-                except ValueError:
-                    rcity = ""
-                    rcoun = ""
-                    coords = data
-                try:
-                    lat, lng, alt = coords.split()[1:4]
-                    alt = int(alt[:-1])  # cut off 'M' for meters
-                except ValueError:
-                    try:
-                        (lat, lng) = coords.split()[1:3]
-                    except ValueError:
-                        # The lat/long is completely hooped, nothing we can do.
-                        (lat, lng) = (None, None)
-                    alt = None
-                # A few jokers out there think O==0
-                if lat and "O" in lat:
-                    lat = lat.replace("O", "0")
-                if lng and "O" in lng:
-                    lng = lng.replace("O", "0")
-
-                self.Report.stat_city = rcity.strip()[::-1]
-                self.Report.stat_country = rcoun.strip()[::-1]
-                self.Report.fulln = loc
-                self.Report.latitude = lat
-                self.Report.longitude = lng
-                self.Report.latf = _parse_lat_long(lat)
-                self.Report.longf = _parse_lat_long(lng)
-                self.Report.altitude = alt
-
-            # The line containing date and time of the report
-            # We have to make sure that the station ID is *not*
-            # in this line to avoid trying to parse the ob: line
-            elif " UTC" in data and self.Report.givenstationid not in data:
-                rtime = data.split("/")[1]
-                self.Report.rtime = rtime.strip()
-
-            # temperature
-
-            elif header == "Temperature":
-                fnht, cels = data.split(None, 3)[0:3:2]
-                self.Report.tempf = float(fnht)
-                # The string we have split is "(NN C)", hence the slice
-                self.Report.temp = float(cels[1:])
-
-            # wind chill
-
-            elif header == "Windchill":
-                fnht, cels = data.split(None, 3)[0:3:2]
-                self.Report.w_chillf = float(fnht)
-                # The string we have split is "(NN C)", hence the slice
-                self.Report.w_chill = float(cels[1:])
-
-            # wind dir and speed
-
-            elif header == "Wind":
-                if "Calm" in data:
-                    self.Report.windspeed = 0.0
-                    self.Report.windspeedkt = 0.0
-                    self.Report.windspeedmph = 0.0
-                    self.Report.winddir = None
-                    self.Report.windcomp = None
-                elif "Variable" in data:
-                    speed = data.split(" ", 3)[2]
-                    self.Report.windspeed = (float(speed) * 0.44704)
-                    self.Report.windspeedkt = int(data.split(" ", 5)[4][1:])
-                    self.Report.windspeedmph = int(speed)
-                    self.Report.winddir = None
-                    self.Report.windcomp = None
-                else:
-                    fields = data.split(" ", 9)[0:9]
-                    comp = fields[2]
-                    deg = fields[3]
-                    speed = fields[6]
-                    speedkt = fields[8][1:]
-                    self.Report.winddir = int(deg[1:])
-                    self.Report.windcomp = comp.strip()
-                    self.Report.windspeed = (float(speed) * 0.44704)
-                    self.Report.windspeedkt = (int(speedkt))
-                    self.Report.windspeedmph = int(speed)
-
-            # visibility
-
-            elif header == "Visibility":
-                for visgroup in data.split():
-                    try:
-                        self.Report.vis = float(visgroup) * 1.609344
-                        break
-                    except ValueError:
-                        self.Report.vis = None
-                        break
+    __slots__ = (
+        "valid", "givenstationid", "fullreport", "reporturl", "code",
+        "rtime", "cycle", "temp", "tempf", "dewp", "dewpf", "humid",
+        "windspeed", "windspeedkt", "windspeedmph", "winddir", "windcomp",
+        "windgust", "windvar", "w_chill", "w_chillf", "vis", "press",
+        "pressmmHg", "weather", "sky", "cloudinfo", "conditions",
+        "cloudtype", "pixmap", "fulln", "stat_city", "stat_country",
+        "latitude", "longitude", "latf", "longf", "altitude")
 
-            # dew point
+    def __init__(self, MetarStationCode=None):
+        """Clear all fields and fill in wanted station id."""
+        for name in self.__slots__:
+            setattr(self, name, None)
+        self.valid = 0
+        self.givenstationid = MetarStationCode
 
-            elif header == "Dew Point":
-                fnht, cels = data.split(None, 3)[0:3:2]
-                self.Report.dewpf = float(fnht)
-                # The string we have split is "(NN C)", hence the slice
-                self.Report.dewp = float(cels[1:])
+    @classmethod
+    def FromReport(cls, report, keepraw=False):
+        """
+        Return a CompactWeatherReport holding the values of the parsed
+        WeatherReport report. The text of the report (fullreport) is
+        only kept if keepraw is true. Strings are interned, so reports
+        share the texts occurring in many of them (e.g. "overcast").
+        """
+        compact = cls.__new__(cls)
+        # Bypasses the __setattr__ of FrozenWeatherReport
+        setter = object.__setattr__
+        for name in CompactWeatherReport.__slots__:
+            value = getattr(report, name, None)
+            if type(value) is str:
+                value = sys.intern(value)
+            setter(compact, name, value)
+        if not keepraw:
+            setter(compact, "fullreport", None)
+        return compact
+
+    def getTokens(self):
+        """
+        Return the groups of the encoded report as a list of (kind, group)
+        tuples, see tokenize_metar().
+        """
+        return tokenize_metar(self.code)
 
-            # humidity
 
-            elif header == "Relative Humidity":
-                h = data.split("%", 1)[0]
-                self.Report.humid = int(h)
+class FrozenWeatherReport(CompactWeatherReport):
 
-            # pressure
+    """A read-only CompactWeatherReport, which can be shared safely, e.g.
+       by ParseCache. The wind chill is computed when it is created,
+       assigning to any attribute raises AttributeError."""
 
-            elif header == "Pressure (altimeter)":
-                press = data.split(" ", 1)[0]
-                self.Report.press = float(press) * 33.863886
-                # 1 in = 25.4 mm => 1 inHg = 25.4 mmHg
-                self.Report.pressmmHg = float(press) * 25.4000
+    __slots__ = ()
 
-            # shot weather desc. ("rain", "mist", ...)
+    def __init__(self, MetarStationCode=None):
+        raise TypeError("Use FrozenWeatherReport.FromReport()")
 
-            elif header == "Weather":
-                self.Report.weather = data
+    @classmethod
+    def FromReport(cls, report, keepraw=False):
+        """
+        Return a FrozenWeatherReport holding the values of the parsed
+        report, see CompactWeatherReport.FromReport(). This computes the
+        wind chill of report, if not done yet.
+        """
+        report.getWindchill()
+        report.getWindchillF()
+        return super().FromReport(report, keepraw)
 
-            # short desc. of sky conditions
+    def __setattr__(self, name, value):
+        raise AttributeError("FrozenWeatherReport objects are read-only")
 
-            elif header == "Sky conditions":
-                self.Report.sky = data
+    def __delattr__(self, name):
+        raise AttributeError("FrozenWeatherReport objects are read-only")
 
-            # the encoded report itself
+    def getWindchill(self):
+        """
+        Return wind chill in degrees Celsius
+        """
+        return self.w_chill
 
-            elif header == "ob":
-                self.Report.code = data.strip()
+    def getWindchillF(self):
+        """
+        Return wind chill in degrees Fahrenheit
+        """
+        return self.w_chillf
 
-            # the cycle value ("time slot")
 
-            elif header == "cycle":
-                try:
-                    self.Report.cycle = int(data)
-                except ValueError:
-                    # cycle value is missing or garbled, assume cycle 0
-                    # TODO: parse the date/time header if it isn't too involved
-                    self.Report.cycle = 0
+class ParseCache:
 
-        # cloud info
-        cloudinfo = self.extractCloudInformation()
-        (cloudinfo, cloudtype, cloudpixmap) = cloudinfo
+    """Parses reports, but returns the result of an earlier parse for
+       reports already seen, e.g. when polling without conditional
+       requests or reading overlapping archives. Reports are recognized
+       by station and a hash of the report text. The results are
+       FrozenWeatherReport objects, shared by all callers getting the
+       same report. The least recently used results are dropped once
+       maxsize are kept. Safe for use by many threads."""
 
-        conditions = self.extractSkyConditions()
-        if conditions is not None:
-            (conditions, condpixmap) = conditions
-        else:
-            (conditions, condpixmap) = (None, None)
+    def __init__(self, maxsize=4096, parser=None, keepraw=False):
+        """
+        parser is a callable returning the ReportParser (or subclass) to
+        parse with, e.g. RawReportParser (default: ReportParser). keepraw
+        tells whether the results keep the report text (fullreport).
+        """
+        if parser is None:
+            parser = ReportParser
+        self.maxsize = maxsize
+        self.parser = parser
+        self.keepraw = keepraw
+        self._results = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def ParseReport(self, report):
+        """
+        Return a FrozenWeatherReport with the values of report, which is
+        an unparsed WeatherReport as returned by ReportFetcher. report
+        itself is only parsed if the same report was not parsed before.
+        """
+        raw = report.fullreport
+        if isinstance(raw, str):
+            raw = raw.encode()
+        key = (report.givenstationid,
+               hashlib.blake2b(raw, digest_size=16).digest())
+        with self._lock:
+            result = self._results.get(key)
+            if result is not None:
+                self._results.move_to_end(key)
+                self._hits += 1
+                return result
+            self._misses += 1
+
+        result = FrozenWeatherReport.FromReport(
+            self.parser().ParseReport(report), self.keepraw)
+        with self._lock:
+            self._results[key] = result
+            while len(self._results) > self.maxsize:
+                self._results.popitem(last=False)
+        return result
+
+    def __len__(self):
+        """Return the number of results kept"""
+        return len(self._results)
+
+    def Clear(self):
+        """Drop all results and reset the counters"""
+        with self._lock:
+            self._results.clear()
+            self._hits = 0
+            self._misses = 0
+
+    def GetHits(self):
+        """Return the number of reports that did not have to be parsed"""
+        return self._hits
+
+    def GetMisses(self):
+        """Return the number of reports that were parsed"""
+        return self._misses
+
+    def GetHitRate(self):
+        """Return the share of reports answered from the cache, or None"""
+        lookups = self._hits + self._misses
+        if lookups == 0:
+            return None
+        return self._hits / lookups
+
+
+_NAN = float("nan")
+
+
+def _windchill(temp, windspeed, w_chill):
+    """Wind chill in degrees Celsius like getWindchill(), NaN if unknown"""
+    if w_chill == w_chill:
+        return w_chill
+    if temp and temp <= 10 and windspeed and windspeed * 3.6 > 4.8:
+        return (13.12 + 0.6215 * temp - 11.37 * (windspeed * 3.6) ** 0.16 +
+                0.3965 * temp * (windspeed * 3.6) ** 0.16)
+    return _NAN
+
+
+def _windchillf(tempf, windspeedmph, w_chillf):
+    """Wind chill in degrees Fahrenheit like getWindchillF()"""
+    if w_chillf == w_chillf:
+        return w_chillf
+    if tempf and tempf <= 50 and windspeedmph and windspeedmph >= 3:
+        return (35.74 + 0.6215 * tempf - 35.75 * windspeedmph ** 0.16 +
+                0.4275 * tempf * windspeedmph ** 0.16)
+    return tempf
+
+
+class ReportBatch:
+
+    """The numeric values of many parsed reports, stored column by column
+       in contiguous arrays of floats, with NaN for missing values. The
+       conversions and derived values are computed for all reports in one
+       call and agree with the corresponding getters of WeatherReport.
+       Columns and results are NumPy arrays if NumPy is installed and
+       array.array("d") otherwise."""
+
+    # The attributes stored, one column each
+    COLUMNS = ("temp", "tempf", "dewp", "dewpf", "humid", "windspeed",
+               "windspeedmph", "winddir", "windgust", "vis", "press",
+               "pressmmHg", "w_chill", "w_chillf", "cycle", "latf",
+               "longf", "altitude")
+
+    def __init__(self, reports=()):
+        """
+        Store the values of the parsed reports (WeatherReport or
+        CompactWeatherReport objects) in the iterable reports.
+        """
+        self.stations = []
+        columns = dict((name, array("d")) for name in self.COLUMNS)
+        for report in reports:
+            self.stations.append(report.givenstationid)
+            for name in self.COLUMNS:
+                value = getattr(report, name, None)
+                columns[name].append(_NAN if value is None else value)
+        if numpy is not None:
+            columns = dict((name, numpy.frombuffer(column))
+                           for (name, column) in columns.items())
+        self._columns = columns
+
+    def __len__(self):
+        """Return the number of reports"""
+        return len(self.stations)
+
+    def getColumn(self, name):
+        """Return the values of the attribute name (see COLUMNS)"""
+        return self._columns[name]
+
+    def _map(self, function, *names):
+        """
+        Return the result of function(*values) for the values of the
+        given columns of every report, for use without NumPy.
+        """
+        return array("d", map(function, *[self._columns[name]
+                                          for name in names]))
 
-        # Some people might want to always use sky or cloud info specifially
-        self.Report.cloudinfo = (cloudinfo, cloudpixmap)
-        self.Report.conditions = (conditions, condpixmap)
+    def getWindSpeedBeaufort(self):
+        """Return the wind speeds in the Beaufort scale"""
+        if numpy is not None:
+            return numpy.round(
+                (self._columns["windspeed"] / 0.8359648) ** (2 / 3.0))
+        return self._map(
+            lambda speed: (round((speed / 0.8359648) ** (2 / 3.0))
+                           if speed == speed else _NAN), "windspeed")
 
-        # fill the weather information
-        self.Report.weather = self.Report.weather or conditions or cloudinfo
+    def getWindSpeedKnots(self):
+        """Return the wind speeds in knots"""
+        if numpy is not None:
+            return self._columns["windspeed"] * 1.94384449
+        return self._map(lambda speed: speed * 1.94384449, "windspeed")
 
-        # Pixmap guessed from general conditions has priority
-        # over pixmap guessed from clouds
-        self.Report.pixmap = condpixmap or cloudpixmap
+    def getVisibilityMiles(self):
+        """Return the visibilities in miles"""
+        if numpy is not None:
+            return self._columns["vis"] / 1.609344
+        return self._map(lambda vis: vis / 1.609344, "vis")
 
-        # Cloud type (Cumulonimbus etc.)
-        if self.Report.cloudtype is None:
-            self.Report.cloudtype = cloudtype
+    def getWindchill(self):
+        """
+        Return the wind chill in degrees Celsius (North American wind
+        chill index), or the value given in the decoded report.
+        """
+        if numpy is None:
+            return self._map(_windchill, "temp", "windspeed", "w_chill")
+        temp = self._columns["temp"]
+        kmh = self._columns["windspeed"] * 3.6
+        with numpy.errstate(invalid="ignore"):
+            applies = ((temp != 0) & (temp <= 10) & (kmh != 0) &
+                       (kmh > 4.8))
+            chill = (13.12 + 0.6215 * temp - 11.37 * kmh ** 0.16 +
+                     0.3965 * temp * kmh ** 0.16)
+        given = self._columns["w_chill"]
+        return numpy.where(numpy.isnan(given),
+                           numpy.where(applies, chill, numpy.nan), given)
 
-        # report is complete
-        self.Report.valid = 1
+    def getWindchillF(self):
+        """
+        Return the wind chill in degrees Fahrenheit, or the temperature
+        where the wind chill index does not apply.
+        """
+        if numpy is None:
+            return self._map(_windchillf, "tempf", "windspeedmph",
+                             "w_chillf")
+        tempf = self._columns["tempf"]
+        mph = self._columns["windspeedmph"]
+        with numpy.errstate(invalid="ignore"):
+            applies = ((tempf != 0) & (tempf <= 50) & (mph != 0) &
+                       (mph >= 3))
+            chill = (35.74 + 0.6215 * tempf - 35.75 * mph ** 0.16 +
+                     0.4275 * tempf * mph ** 0.16)
+        given = self._columns["w_chillf"]
+        return numpy.where(numpy.isnan(given),
+                           numpy.where(applies, chill, tempf), given)
+
+
+def _kdtree_order(points, dims):
+    """
+    Return the indices of points (tuples of at least dims coordinates)
+    arranged as a balanced k-d tree: the root of each range [lo, hi) is
+    at (lo + hi) // 2 and splits it along axis depth % dims.
+    """
+    order = list(range(len(points)))
+    stack = [(0, len(order), 0)]
+    while stack:
+        (lo, hi, axis) = stack.pop()
+        if hi - lo <= 1:
+            continue
+        order[lo:hi] = sorted(order[lo:hi], key=lambda i: points[i][axis])
+        mid = (lo + hi) // 2
+        stack.append((lo, mid, (axis + 1) % dims))
+        stack.append((mid + 1, hi, (axis + 1) % dims))
+    return order
 
-        return self.Report
 
+def _unit_vector(lat, lon):
+    """Return the point on the unit sphere at lat, lon (degrees)"""
+    (lat, lon) = (math.radians(lat), math.radians(lon))
+    return (math.cos(lat) * math.cos(lon), math.cos(lat) * math.sin(lon),
+            math.sin(lat))
 
-class ReportFetcher:
 
-    """Fetches a report from a given METAR id, optionally taking into
+_STATION_ID_RE = re.compile(r"\(([A-Z0-9]{3,5})\)")
+
+
+def _report_station(raw):
+    """
+    Return the station ID found in the first line of a decoded report
+    (bytes), e.g. "EDDL" for "Duesseldorf, Germany (EDDL) 51-18N ...",
+    or None.
+    """
+    line = raw.split(b"\n", 1)[0].decode("latin-1")
+    found = _STATION_ID_RE.findall(line)
+    if found:
+        return found[-1]
+    return None
+
+
+class StationIndex:
+
+    """Finds stations by position. Nearest-station queries use a k-d tree
+       over the stations' points on the unit sphere, the straight-line
+       distance between those orders stations by great-circle distance.
+       Bounding box queries use a k-d tree over latitude and longitude.
+       Both take logarithmic time for typical queries."""
+
+    # Mean radius of the earth in km
+    EARTH_RADIUS = 6371.0088
+
+    def __init__(self, stations=()):
+        """
+        stations is an iterable of (station, latitude, longitude) tuples,
+        latitude and longitude in degrees (N and E are positive).
+        """
+        self._positions = {}
+        for (station, lat, lon) in stations:
+            self._positions[station] = (lat, lon)
+        ids = list(self._positions)
+
+        points = [_unit_vector(*self._positions[i]) for i in ids]
+        order = _kdtree_order(points, 3)
+        self._sphere = [points[i] for i in order]
+        self._sphereids = [ids[i] for i in order]
+
+        points = [self._positions[i] for i in ids]
+        order = _kdtree_order(points, 2)
+        self._plane = [points[i] for i in order]
+        self._planeids = [ids[i] for i in order]
+
+    @classmethod
+    def FromReports(cls, reports):
+        """
+        Return a StationIndex of the stations of the parsed reports that
+        have a position.
+        """
+        return cls((report.givenstationid, report.latf, report.longf)
+                   for report in reports
+                   if report.latf is not None and report.longf is not None)
+
+    @classmethod
+    def FromCatalog(cls, source):
+        """
+        Return a StationIndex of the stations in a catalog file, a file
+        name or file object. Each line of the catalog is a station line as
+        found at the top of the NOAA's decoded reports, e.g.
+        "Duesseldorf, Germany (EDDL) 51-17N 006-46E 37M".
+        """
+        if isinstance(source, (str, bytes, os.PathLike)):
+            with open(source, "rb") as fd:
+                return cls(_iter_catalog(fd))
+        return cls(_iter_catalog(source))
+
+    def __len__(self):
+        """Return the number of stations"""
+        return len(self._positions)
+
+    def GetPosition(self, station):
+        """Return (latitude, longitude) of station or None"""
+        return self._positions.get(station)
+
+    def Nearest(self, lat, lon, count=1, maxdistance=None):
+        """
+        Return a list of up to count (distance, station) tuples for the
+        stations nearest to lat, lon, nearest first. Distances are
+        great-circle distances in km. maxdistance optionally limits the
+        distance of the stations returned.
+        """
+        target = _unit_vector(lat, lon)
+        tree = self._sphere
+        # Squared straight-line distance up to which stations are kept
+        bound = 4.0
+        if maxdistance is not None:
+            angle = min(maxdistance / self.EARTH_RADIUS, math.pi)
+            bound = (2 * math.sin(angle / 2)) ** 2
+        # Max-heap of the best stations so far: (-distance ** 2, index)
+        best = []
+
+        def visit(lo, hi, axis):
+            mid = (lo + hi) // 2
+            point = tree[mid]
+            dist = ((point[0] - target[0]) ** 2 +
+                    (point[1] - target[1]) ** 2 +
+                    (point[2] - target[2]) ** 2)
+            if dist <= bound:
+                if len(best) < count:
+                    heapq.heappush(best, (-dist, mid))
+                elif dist < -best[0][0]:
+                    heapq.heapreplace(best, (-dist, mid))
+            diff = target[axis] - point[axis]
+            following = (axis + 1) % 3
+            if diff < 0:
+                (near, far) = ((lo, mid), (mid + 1, hi))
+            else:
+                (near, far) = ((mid + 1, hi), (lo, mid))
+            if near[0] < near[1]:
+                visit(near[0], near[1], following)
+            if far[0] < far[1]:
+                worst = bound if len(best) < count else -best[0][0]
+                if diff * diff <= worst:
+                    visit(far[0], far[1], following)
+
+        if tree and count > 0:
+            visit(0, len(tree), 0)
+        result = []
+        for (dist, index) in sorted(best, reverse=True):
+            chord = min(math.sqrt(-dist), 2.0)
+            result.append((2 * self.EARTH_RADIUS * math.asin(chord / 2),
+                           self._sphereids[index]))
+        return result
+
+    def Within(self, south, west, north, east):
+        """
+        Return a list of the stations in the bounding box given by the
+        latitudes south and north and the longitudes west and east, in
+        degrees. If west is greater than east, the box spans the 180th
+        meridian.
+        """
+        if west > east:
+            return (self.Within(south, west, north, 180.0) +
+                    self.Within(south, -180.0, north, east))
+        tree = self._plane
+        low = (south, west)
+        high = (north, east)
+        result = []
+
+        def visit(lo, hi, axis):
+            mid = (lo + hi) // 2
+            point = tree[mid]
+            if (south <= point[0] <= north and west <= point[1] <= east):
+                result.append(self._planeids[mid])
+            if lo < mid and low[axis] <= point[axis]:
+                visit(lo, mid, 1 - axis)
+            if mid + 1 < hi and point[axis] <= high[axis]:
+                visit(mid + 1, hi, 1 - axis)
+
+        if tree:
+            visit(0, len(tree), 0)
+        return result
+
+
+def _iter_catalog(lines):
+    """
+    Yield (station, latitude, longitude) for the station lines of a
+    catalog (see StationIndex.FromCatalog()) that hold a position.
+    """
+    for line in lines:
+        if isinstance(line, bytes):
+            line = line.decode("latin-1")
+        found = _STATION_ID_RE.findall(line)
+        if not found:
+            continue
+        try:
+            values = _station_values(found[-1], line.strip())
+        except (ValueError, IndexError):
+            continue
+        if values and values[5] is not None and values[6] is not None:
+            yield (found[-1], values[5], values[6])
+
+
+def _catalog_entries(source):
+    """
+    Yield (station, name, city, country, latitude, longitude, altitude)
+    for the stations in source, see compile_station_catalog().
+    """
+    if os.path.isdir(source) or tarfile.is_tarfile(source):
+        for report in iter_reports(source):
+            # Skip reports lacking the station line
+            if report.givenstationid is not None and report.fulln:
+                yield (report.givenstationid, report.fulln,
+                       report.stat_city, report.stat_country, report.latf,
+                       report.longf, report.altitude)
+        return
+    with open(source, "rb") as fd:
+        for line in fd:
+            line = line.decode("latin-1")
+            found = _STATION_ID_RE.findall(line)
+            if not found:
+                continue
+            try:
+                values = _station_values(found[-1], line.strip())
+            except (ValueError, IndexError):
+                continue
+            if values:
+                (city, country, name, _, _, latf, longf, alt) = values
+                yield (found[-1], name, city, country, latf, longf, alt)
+
+
+def _catalog_text(value, size):
+    """Encode value for a text field of size bytes of a catalog record"""
+    if value is None:
+        return b""
+    return value.encode("utf-8")[:size]
+
+
+def compile_station_catalog(source, target):
+    """
+    Compile a binary station catalog, to be read with StationCatalog,
+    from source and write it to the file target. source is a directory
+    or tar archive of reports (see iter_reports()) or a text file with a
+    station line as found at the top of the NOAA's decoded reports per
+    line (e.g. "Duesseldorf, Germany (EDDL) 51-17N 006-46E 37M"). If a
+    station occurs more than once, the last entry counts. Return the
+    number of stations written.
+    """
+    stations = {}
+    for entry in _catalog_entries(source):
+        stations[entry[0].encode("ascii")[:8]] = entry
+    record = StationCatalog.RECORD
+    with open(target, "wb") as fd:
+        fd.write(StationCatalog.HEADER.pack(
+            StationCatalog.MAGIC, StationCatalog.VERSION, record.size,
+            len(stations)))
+        for key in sorted(stations):
+            (_, name, city, country, latf, longf, alt) = stations[key]
+            fd.write(record.pack(
+                key, _NAN if latf is None else latf,
+                _NAN if longf is None else longf,
+                StationCatalog.NOALTITUDE if alt is None else alt,
+                _catalog_text(name, 64), _catalog_text(city, 40),
+                _catalog_text(country, 40)))
+    return len(stations)
+
+
+class StationCatalog:
+
+    """Looks up station names and positions in a binary catalog made by
+       compile_station_catalog(). The file is memory-mapped and searched
+       in place, so opening it takes no time and all processes using the
+       same catalog share its pages. The catalog consists of a header and
+       fixed-size records sorted by station ID."""
+
+    MAGIC = b"PYMETCAT"
+    VERSION = 1
+    # magic, version, record size, number of records
+    HEADER = struct.Struct("<8sHHI")
+    # station ID, latitude, longitude, altitude, name, city, country
+    RECORD = struct.Struct("<8sddi64s40s40s")
+    # Altitude of stations whose altitude is not known
+    NOALTITUDE = -2 ** 31
+
+    def __init__(self, path):
+        """Open the catalog in the file path"""
+        with open(path, "rb") as fd:
+            self._map = mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            (magic, version, size, count) = self.HEADER.unpack_from(
+                self._map)
+        except struct.error:
+            magic = None
+        if (magic != self.MAGIC or version != self.VERSION or
+                size != self.RECORD.size or
+                len(self._map) < self.HEADER.size + size * count):
+            self._map.close()
+            raise ValueError("%s is not a pymetar station catalog" % path)
+        self._count = count
+
+    def __len__(self):
+        """Return the number of stations"""
+        return self._count
+
+    def __contains__(self, station):
+        """Tell whether station is in the catalog"""
+        return self._find(station) is not None
+
+    def _key(self, index):
+        """Return the padded station ID of record index"""
+        offset = self.HEADER.size + index * self.RECORD.size
+        return self._map[offset:offset + 8]
+
+    def _find(self, station):
+        """Return the index of the record of station, or None"""
+        key = station.encode("ascii", "replace")[:8].ljust(8, b"\0")
+        (lo, hi) = (0, self._count)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self._count and self._key(lo) == key:
+            return lo
+        return None
+
+    def _record(self, index):
+        """Return the values of record index, see Lookup()"""
+        (key, lat, lon, alt, name, city, country) = self.RECORD.unpack_from(
+            self._map, self.HEADER.size + index * self.RECORD.size)
+        return (key.rstrip(b"\0").decode("ascii"),
+                name.rstrip(b"\0").decode("utf-8", "ignore"),
+                city.rstrip(b"\0").decode("utf-8", "ignore"),
+                country.rstrip(b"\0").decode("utf-8", "ignore"),
+                None if lat != lat else lat, None if lon != lon else lon,
+                None if alt == self.NOALTITUDE else alt)
+
+    def Lookup(self, station):
+        """
+        Return a tuple (station, name, city, country, latitude, longitude,
+        altitude) for station, or None if it is not in the catalog.
+        Latitude and longitude are floats, altitude is in meters.
+        """
+        index = self._find(station)
+        if index is None:
+            return None
+        return self._record(index)
+
+    def Stations(self):
+        """Return a list of all station IDs, sorted"""
+        return [self._key(i).rstrip(b"\0").decode("ascii")
+                for i in range(self._count)]
+
+    def Positions(self):
+        """
+        Yield (station, latitude, longitude) for the stations with a
+        position, e.g. to build a StationIndex.
+        """
+        for index in range(self._count):
+            record = self._record(index)
+            if record[4] is not None and record[5] is not None:
+                yield (record[0], record[4], record[5])
+
+    def FillReport(self, report):
+        """
+        Fill in station name and position of report from the catalog,
+        e.g. for reports parsed with RawReportParser. Return True if the
+        station was found.
+        """
+        record = self.Lookup(report.givenstationid or "")
+        if record is None:
+            return False
+        (_, report.fulln, report.stat_city, report.stat_country,
+         report.latf, report.longf, report.altitude) = record
+        return True
+
+    def close(self):
+        """Unmap the catalog"""
+        self._map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class StationCache:
+
+    """Remembers the station name and position parsed from the first line
+       of each station's report. The line rarely changes between reports,
+       so it only needs to be parsed again if it does. A single instance,
+       STATION_CACHE, is shared by all ReportParser objects. It is safe
+       to use from several threads."""
+
+    def __init__(self, maxsize=20000):
+        """maxsize is the number of stations kept at most"""
+        self.maxsize = maxsize
+        self._stations = {}
+        self._hits = 0
+        self._misses = 0
+        self._lock = threading.Lock()
+
+    def Lookup(self, station, line):
+        """
+        Return the values parsed from the first line of the report of
+        station, or None if that was a different line or is not known.
+        """
+        with self._lock:
+            entry = self._stations.get(station)
+            if entry is not None and entry[0] == line:
+                self._hits += 1
+                return entry[1]
+            self._misses += 1
+            return None
+
+    def Store(self, station, line, values):
+        """Remember the values parsed from the first line of a report"""
+        with self._lock:
+            if (len(self._stations) < self.maxsize or
+                    station in self._stations):
+                self._stations[station] = (line, values)
+
+    def Clear(self):
+        """Forget all stations and reset the counters"""
+        with self._lock:
+            self._stations = {}
+            self._hits = 0
+            self._misses = 0
+
+    def GetHits(self):
+        """Return the number of lines that did not have to be parsed"""
+        return self._hits
+
+    def GetMisses(self):
+        """Return the number of lines that had to be parsed"""
+        return self._misses
+
+    def GetHitRate(self):
+        """Return the share of lookups answered from the cache, or None"""
+        with self._lock:
+            (hits, misses) = (self._hits, self._misses)
+        if hits + misses == 0:
+            return None
+        return hits / (hits + misses)
+
+
+STATION_CACHE = StationCache()
+
+
+def _parse_station_line(report, line):
+    """Fill in station name and position from the first line"""
+    station = report.givenstationid
+    values = STATION_CACHE.Lookup(station, line)
+    if values is None:
+        values = _station_values(station, line)
+        STATION_CACHE.Store(station, line, values)
+    if values:
+        (report.stat_city, report.stat_country, report.fulln,
+         report.latitude, report.longitude, report.latf, report.longf,
+         report.altitude) = values
+
+
+def _station_values(station, line):
+    """
+    Parse the first line of the report of station. Return a tuple (city,
+    country, full name, latitude, longitude, latitude as float, longitude
+    as float, altitude), or an empty tuple if the station is not found.
+    """
+    try:
+        header, data = line.split(":", 1)
+    except ValueError:
+        header = data = line
+    header = header.strip()
+    data = data.strip()
+
+    # The station id inside the report
+    # As the station line may contain additional sets of (),
+    # we have to search from the rear end and flip things around
+    id_offset = header.find("(" + station + ")")
+    if id_offset == -1:
+        return ()
+    loc = data[:id_offset]
+    coords = data[id_offset:]
+    try:
+        loc = loc.strip()
+        rloc = loc[::-1]
+        rcoun, rcity = rloc.split(",", 1)
+    except ValueError:
+        rcity = ""
+        rcoun = ""
+        coords = data
+    try:
+        lat, lng, alt = coords.split()[1:4]
+        alt = int(alt[:-1])  # cut off 'M' for meters
+    except ValueError:
+        try:
+            (lat, lng) = coords.split()[1:3]
+        except ValueError:
+            # The lat/long is completely hooped, nothing we can do.
+            (lat, lng) = (None, None)
+        alt = None
+    # A few jokers out there think O==0
+    if lat and "O" in lat:
+        lat = lat.replace("O", "0")
+    if lng and "O" in lng:
+        lng = lng.replace("O", "0")
+
+    return (rcity.strip()[::-1], rcoun.strip()[::-1], loc, lat, lng,
+            _parse_lat_long(lat), _parse_lat_long(lng), alt)
+
+
+def _parse_time_line(report, line):
+    """Fill in the observation time from the second line"""
+    # Make sure this is not the ob: line of a report lacking the
+    # time line.
+    if " UTC" in line and report.givenstationid not in line:
+        rtime = line.split("/")[1]
+        report.rtime = rtime.strip()
+
+
+def _parse_temperature(report, data):
+    """Temperature: 68 F (20 C)"""
+    fnht, cels = data.split(None, 3)[0:3:2]
+    report.tempf = float(fnht)
+    # The string we have split is "(NN C)", hence the slice
+    report.temp = float(cels[1:])
+
+
+def _parse_windchill(report, data):
+    """Windchill: 28 F (-2 C):1"""
+    fnht, cels = data.split(None, 3)[0:3:2]
+    report.w_chillf = float(fnht)
+    # The string we have split is "(NN C)", hence the slice
+    report.w_chill = float(cels[1:])
+
+
+def _parse_wind(report, data):
+    """Wind: from the SW (220 degrees) at 9 MPH (8 KT):0"""
+    if "Calm" in data:
+        report.windspeed = 0.0
+        report.windspeedkt = 0.0
+        report.windspeedmph = 0.0
+        report.winddir = None
+        report.windcomp = None
+    elif "Variable" in data:
+        speed = data.split(" ", 3)[2]
+        report.windspeed = (float(speed) * 0.44704)
+        report.windspeedkt = int(data.split(" ", 5)[4][1:])
+        report.windspeedmph = int(speed)
+        report.winddir = None
+        report.windcomp = None
+    else:
+        fields = data.split(" ", 9)[0:9]
+        comp = fields[2]
+        deg = fields[3]
+        speed = fields[6]
+        speedkt = fields[8][1:]
+        report.winddir = int(deg[1:])
+        report.windcomp = comp.strip()
+        report.windspeed = (float(speed) * 0.44704)
+        report.windspeedkt = (int(speedkt))
+        report.windspeedmph = int(speed)
+
+
+def _parse_visibility(report, data):
+    """Visibility: 3 mile(s):0"""
+    for visgroup in data.split():
+        try:
+            report.vis = float(visgroup) * 1.609344
+            break
+        except ValueError:
+            report.vis = None
+            break
+
+
+def _parse_dewpoint(report, data):
+    """Dew Point: 57 F (14 C)"""
+    fnht, cels = data.split(None, 3)[0:3:2]
+    report.dewpf = float(fnht)
+    # The string we have split is "(NN C)", hence the slice
+    report.dewp = float(cels[1:])
+
+
+def _parse_humidity(report, data):
+    """Relative Humidity: 87%"""
+    h = data.split("%", 1)[0]
+    report.humid = int(h)
+
+
+def _parse_pressure(report, data):
+    """Pressure (altimeter): 30.00 in. Hg (1016 hPa)"""
+    press = data.split(" ", 1)[0]
+    report.press = float(press) * 33.863886
+    # 1 in = 25.4 mm => 1 inHg = 25.4 mmHg
+    report.pressmmHg = float(press) * 25.4000
+
+
+def _parse_weather(report, data):
+    """Weather: mist -- short desc. ("rain", "mist", ...)"""
+    report.weather = data
+
+
+def _parse_sky(report, data):
+    """Sky conditions: mostly cloudy"""
+    report.sky = data
+
+
+def _parse_ob(report, data):
+    """ob: EDDL 260850Z ... -- the encoded report itself"""
+    report.code = data.strip()
+
+
+def _parse_cycle(report, data):
+    """cycle: 9 -- the cycle value ("time slot")"""
+    try:
+        report.cycle = int(data)
+    except ValueError:
+        # cycle value is missing or garbled, assume cycle 0
+        # TODO: parse the date/time header if it isn't too involved
+        report.cycle = 0
+
+
+# Handlers for the lines of the decoded report, keyed by header. "station"
+# and "time" are the first two lines, which have no header.
+_HEADER_HANDLERS = {
+    "station": _parse_station_line,
+    "time": _parse_time_line,
+    "Temperature": _parse_temperature,
+    "Windchill": _parse_windchill,
+    "Wind": _parse_wind,
+    "Visibility": _parse_visibility,
+    "Dew Point": _parse_dewpoint,
+    "Relative Humidity": _parse_humidity,
+    "Pressure (altimeter)": _parse_pressure,
+    "Weather": _parse_weather,
+    "Sky conditions": _parse_sky,
+    "ob": _parse_ob,
+    "cycle": _parse_cycle,
+}
+
+# The WeatherReport attributes filled in by the handler of each header,
+# used to parse lazily. "ob" includes those derived from the encoded
+# report, "weather" falls back to the conditions if there is no Weather
+# line.
+_HEADER_FIELDS = {
+    "station": ("stat_city", "stat_country", "fulln", "latitude",
+                "longitude", "latf", "longf", "altitude"),
+    "time": ("rtime",),
+    "Temperature": ("temp", "tempf"),
+    "Windchill": ("w_chill", "w_chillf"),
+    "Wind": ("windspeed", "windspeedkt", "windspeedmph", "winddir",
+             "windcomp"),
+    "Visibility": ("vis",),
+    "Dew Point": ("dewp", "dewpf"),
+    "Relative Humidity": ("humid",),
+    "Pressure (altimeter)": ("press", "pressmmHg"),
+    "Weather": ("weather",),
+    "Sky conditions": ("sky",),
+    "ob": ("code", "tokens", "cloudinfo", "conditions", "weather",
+           "pixmap", "cloudtype"),
+    "cycle": ("cycle",),
+}
+# The headers to parse to get an attribute, in order
+_FIELD_HEADERS = {}
+for (_header, _fields) in _HEADER_FIELDS.items():
+    for _field in _fields:
+        _FIELD_HEADERS[_field] = _FIELD_HEADERS.get(_field, ()) + (_header,)
+del _header, _fields, _field
+# Held while the values of a lazily parsed report are filled in, so that
+# other threads do not see them half done
+_LAZY_LOCK = threading.RLock()
+
+
+def _find_line(text, body, header):
+    """
+    Return the rest of the last line starting with "header:" in the text
+    of a decoded report (from offset body on), with whitespace stripped,
+    or None. The first two lines (station and time) have no header.
+    """
+    if header == "station":
+        return text.split("\n", 1)[0]
+    if header == "time":
+        lines = text.split("\n", 2)
+        return lines[1] if len(lines) > 1 else None
+    if body == -1:
+        return None
+    start = text.rfind("\n" + header + ":", body)
+    if start == -1:
+        return None
+    start += len(header) + 2
+    end = text.find("\n", start)
+    if end == -1:
+        end = len(text)
+    return text[start:end].strip()
+
+
+class ReportParser:
+
+    """Parse raw METAR data from a WeatherReport object into actual
+    values and return the object with the values filled in."""
+
+    # Up to this many headers to parse, each one is found in the report
+    # in place, which allocates less than splitting the whole report into
+    # lines. With many headers, that is slower.
+    FIND_HEADERS_MAX = 4
+
+    def __init__(self, MetarReport=None, fields=None, lazy=False):
+        """
+        Set attribute Report as specified on instantation.
+        fields optionally restricts parsing to the given headers of the
+        decoded report (e.g. "Temperature", "Pressure (altimeter)"; the
+        first two lines are called "station" and "time"), which makes
+        parsing faster if only a few values are needed. The values taken
+        from the encoded report (clouds, conditions) need "ob".
+        If lazy is true, ParseReport() only checks the report can be
+        decoded and each value is parsed when it is first accessed, by
+        looking up its line, so the cost depends on the values used.
+        Errors in garbled lines then show up on access instead of in
+        ParseReport().
+        """
+        self.Report = MetarReport
+        self.lazy = lazy
+        # The handlers, handlers run on access, attributes they fill in
+        # and whether other headers have handlers, for lazy parsing
+        self._lazyplan = None
+        # The handlers and the headers to look up in the raw report
+        self._headerkeys = None
+        self.handlers = _HEADER_HANDLERS
+        if fields is not None:
+            self.handlers = dict((header, handler) for (header, handler)
+                                 in _HEADER_HANDLERS.items()
+                                 if header in fields)
+
+    def RegisterHandler(self, header, handler):
+        """
+        Call handler(report, data) for every line of the decoded report
+        starting with "header:", data being the rest of the line with
+        whitespace stripped. This replaces the built-in handler for that
+        header, if any.
+        """
+        self.handlers = dict(self.handlers)
+        self.handlers[header] = handler
+
+    def DisableField(self, header):
+        """Do not parse the lines starting with "header:" any more"""
+        self.handlers = dict(self.handlers)
+        self.handlers.pop(header, None)
+
+    def extractCloudInformation(self):
+        """
+        Extract cloud information. Return None or a tuple (sky type as a
+        string of text, cloud type (if any)  and suggested pixmap name)
+        """
+        matches = self._groups("cloud")
+        skytype = None
+        ctype = None
+        pixmap = None
+        for wcloud in matches:
+            if wcloud is not None:
+                stype = wcloud[:3]
+                if stype in ("CLR", "SKC", "CAV", "NSC"):
+                    skytype = "Clear sky"
+                    pixmap = "sun"
+                elif stype == "BKN":
+                    skytype = "Broken clouds"
+                    pixmap = "suncloud"
+                elif stype == "SCT":
+                    skytype = "Scattered clouds"
+                    pixmap = "suncloud"
+                elif stype == "FEW":
+                    skytype = "Few clouds"
+                    pixmap = "suncloud"
+                elif stype == "OVC":
+                    skytype = "Overcast"
+                    pixmap = "cloud"
+                if ctype is None:
+                    ctype = CLOUDTYPES.get(wcloud[6:], None)
+
+        return (skytype, ctype, pixmap)
+
+    def extractSkyConditions(self):
+        """
+        Extract sky condition information from the encoded report. Return
+        a tuple containing the description of the sky conditions as a
+        string and a suggested pixmap name for an icon representing said
+        sky condition.
+        """
+        for wcond in self._groups("weather"):
+            condition = _CONDITIONS.get(wcond)
+            if condition is not None:
+                return condition
+
+    def _groups(self, kind):
+        """
+        Return the groups of the given kind (see tokenize_metar()) from
+        the encoded report.
+        """
+        if self.Report.tokens is None:
+            self.Report.tokens = tokenize_metar(self.Report.code)
+        return [group for (gkind, group) in self.Report.tokens
+                if gkind == kind]
+
+    def match_WeatherPart(self, regexp):
+        """
+        Return the matching part of the encoded Metar report.
+        regexp: the regexp needed to extract this part.
+        Return the first matching string or None.
+        WARNING: Some Metar reports may contain several matching
+        strings, only the first one is taken into account!
+        """
+        matches = []
+        # FIXME This mixes direct access to the "code" attribute and the accessor function "getRawMetarCode" which just returns "code".
+        if self.Report.code is not None:
+            myre = re.compile(regexp)
+            for wpart in self.Report.getRawMetarCode().split():
+                match = myre.match(wpart)
+                if match:
+                    matches.append(match.group())
+        return matches
+
+    def ParseReport(self, MetarReport=None):
+        """Take report with raw info only and return it with in
+        parsed values filled in. Note: This function edits the
+        WeatherReport object you supply!"""
+        if self.Report is None and MetarReport is None:
+            raise EmptyReportException(
+                "No report given on init and ParseReport().")
+        elif MetarReport is not None:
+            self.Report = MetarReport
+
+        raw = self.Report.fullreport
+        if isinstance(raw, memoryview):
+            raw = raw.tobytes()
+        if not self.lazy and raw.isascii():
+            keys = self._headerKeys()
+            if len(keys) <= self.FIND_HEADERS_MAX:
+                return self._parseBytes(raw, keys)
+        try:
+            text = raw.decode()
+        except UnicodeDecodeError:
+            raise GarbledReportException(
+                "Report is not valid ASCII or Unicode.")
+        if self.lazy:
+            return self._indexReport(text)
+
+        lines = text.split("\n")
+        handlers = self.handlers
+        report = self.Report
+
+        # The first line names the station, the second one holds the
+        # date and time of the report.
+        if "station" in handlers:
+            handlers["station"](report, lines[0])
+        if len(lines) > 1 and "time" in handlers:
+            handlers["time"](report, lines[1])
+
+        for line in lines[2:]:
+            (header, _, data) = line.partition(":")
+            handler = handlers.get(header.strip())
+            if handler is not None:
+                handler(report, data.strip())
+
+        return self._completeReport()
+
+    def _headerKeys(self):
+        """
+        Return a list of tuples (b"\\nheader:", handler) for the handlers
+        of the lines with a header.
+        """
+        handlers = self.handlers
+        if self._headerkeys is None or self._headerkeys[0] is not handlers:
+            self._headerkeys = (handlers, [
+                (b"\n" + header.encode() + b":", handler)
+                for (header, handler) in handlers.items()
+                if header not in ("station", "time")])
+        return self._headerkeys[1]
+
+    def _parseBytes(self, raw, keys):
+        """
+        Parse an ASCII report like ParseReport(), but look up the line of
+        each header in the bytes in place instead of decoding and
+        splitting the whole report: only the values handed to the
+        handlers are turned into strings. keys is the result of
+        _headerKeys(), the handlers are run in that order.
+        """
+        handlers = self.handlers
+        report = self.Report
+
+        # The first line names the station, the second one holds the
+        # date and time of the report.
+        first = raw.find(b"\n")
+        if first == -1:
+            first = len(raw)
+        if "station" in handlers:
+            handlers["station"](report, raw[:first].decode("ascii"))
+        body = raw.find(b"\n", first + 1)
+        if first < len(raw) and "time" in handlers:
+            end = body if body != -1 else len(raw)
+            handlers["time"](report, raw[first + 1:end].decode("ascii"))
+
+        if body != -1:
+            for (key, handler) in keys:
+                start = raw.rfind(key, body)
+                if start == -1:
+                    continue
+                start += len(key)
+                end = raw.find(b"\n", start)
+                if end == -1:
+                    end = len(raw)
+                handler(report, raw[start:end].strip().decode("ascii"))
+
+        return self._completeReport()
+
+    def _indexReport(self, text):
+        """
+        Leave the values of the report to be parsed on first access by
+        WeatherReport.__getattr__(): remove the attributes the handlers
+        fill in from the report and remember the text and the handlers.
+        """
+        handlers = self.handlers
+        report = self.Report
+        if self._lazyplan is None or self._lazyplan[0] is not handlers:
+            pending = {}
+            for (header, handler) in handlers.items():
+                if header in _HEADER_FIELDS:
+                    pending[header] = handler
+            # The values derived from the encoded report are always
+            # filled in
+            pending.setdefault("ob", None)
+            fields = set()
+            for header in pending:
+                fields.update(_HEADER_FIELDS[header])
+            # Whether handlers are registered for other headers
+            other = any(header not in _HEADER_FIELDS for header in handlers)
+            self._lazyplan = (handlers, pending, tuple(fields), other)
+        (_, pending, fields, other) = self._lazyplan
+
+        # Offset of the newline before the third line, where the lines
+        # with headers start
+        body = text.find("\n", text.find("\n") + 1)
+        report._lazy = (text, body, dict(pending))
+        attributes = report.__dict__
+        for field in fields:
+            attributes.pop(field, None)
+
+        if other and body != -1:
+            # Handlers registered for other headers may fill in anything,
+            # run them right away
+            for line in text[body + 1:].split("\n"):
+                (header, _, data) = line.partition(":")
+                header = header.strip()
+                if header in handlers and header not in _HEADER_FIELDS:
+                    handlers[header](report, data.strip())
+        report.valid = 1
+        return report
+
+    def ParseEncoded(self, MetarReport=None):
+        """Fill in the values derived from the encoded report only, for
+        reports that have their code attribute set but no decoded text,
+        and return the report."""
+        if MetarReport is not None:
+            self.Report = MetarReport
+        if self.Report is None:
+            raise EmptyReportException(
+                "No report given on init and ParseEncoded().")
+        return self._completeReport()
+
+    def _completeReport(self, tokens=None):
+        """
+        Fill in the values derived from the encoded report (clouds,
+        conditions, pixmap), mark the report valid and return it.
+        tokens is the result of tokenize_metar() if already known.
+        """
+        if tokens is None:
+            tokens = tokenize_metar(self.Report.code)
+        self.Report.tokens = tokens
+
+        # cloud info
+        cloudinfo = self.extractCloudInformation()
+        (cloudinfo, cloudtype, cloudpixmap) = cloudinfo
+
+        conditions = self.extractSkyConditions()
+        if conditions is not None:
+            (conditions, condpixmap) = conditions
+        else:
+            (conditions, condpixmap) = (None, None)
+
+        # Some people might want to always use sky or cloud info specifially
+        self.Report.cloudinfo = (cloudinfo, cloudpixmap)
+        self.Report.conditions = (conditions, condpixmap)
+
+        # fill the weather information
+        self.Report.weather = self.Report.weather or conditions or cloudinfo
+
+        # Pixmap guessed from general conditions has priority
+        # over pixmap guessed from clouds
+        self.Report.pixmap = condpixmap or cloudpixmap
+
+        # Cloud type (Cumulonimbus etc.)
+        if self.Report.cloudtype is None:
+            self.Report.cloudtype = cloudtype
+
+        # report is complete
+        self.Report.valid = 1
+
+        return self.Report
+
+
+_COMPASS = ("N", "NNE", "NE", "ENE", "E", "ESE", "SE", "SSE",
+            "S", "SSW", "SW", "WSW", "W", "WNW", "NW", "NNW")
+# Sky conditions as worded by the NOAA, by the largest cloud cover
+_SKY_COVER = {"CLR": (0, "clear"), "SKC": (0, "clear"),
+              "NSC": (0, "clear"), "CAV": (0, "clear"),
+              "FEW": (1, "mostly clear"), "SCT": (2, "partly cloudy"),
+              "BKN": (3, "mostly cloudy"), "OVC": (4, "overcast"),
+              "VV": (5, "obscured")}
+# Factors to convert wind speeds to m/s
+_WIND_UNITS = {"KT": 0.514444, "MPS": 1.0, "KMH": 1 / 3.6}
+_WIND_RE = re.compile(
+    r"^(VRB|[0-9]{3}|///)([0-9]{2,3}|//)(?:G([0-9]{2,3}))?(KT|MPS|KMH)$")
+
+
+def _metar_temperature(value):
+    """Convert a temperature like "M05" to a float (-5.0) or None"""
+    if not value or "/" in value:
+        return None
+    if value[0] == "M":
+        return -float(value[1:])
+    return float(value)
+
+
+_TENTHS_RE = re.compile(r"^T([01])([0-9]{3})([01])([0-9]{3})$")
+
+
+def _tenths_temperature(sign, value):
+    """Convert the temperature of a "T01390123" remark to a float"""
+    if sign == "1":
+        return -int(value) / 10.0
+    return int(value) / 10.0
+
+
+def _metar_visibility(group, whole=None):
+    """
+    Convert a visibility group to km. Groups are meters ("0800", "9999"
+    is 10 km or more) or statute miles ("10SM", "M1/4SM", "P6SM", with
+    the whole miles of e.g. "1 1/2SM" given separately in whole).
+    """
+    if group == "CAVOK":
+        return 10.0
+    if not group.endswith("SM"):
+        meters = int(group[:4])
+        if meters == 9999:
+            meters = 10000
+        return meters / 1000.0
+    miles = group[:-2].lstrip("MP")
+    if "/" in miles:
+        (num, den) = miles.split("/")
+        if float(den) == 0:
+            return None
+        miles = float(num) / float(den)
+    else:
+        miles = float(miles)
+    if whole:
+        miles += float(whole)
+    return miles * 1.609344
+
+
+class RawReportParser(ReportParser):
+
+    """Parse a raw METAR report (just the encoded report, e.g.
+    "EDDL 260850Z 22008KT 5000 BR SCT006 BKN012 16/14 Q1016") into a
+    WeatherReport, without the decoded text the NOAA provides in
+    addition. Station name and position are not part of a METAR and
+    remain unset. Humidity is computed from temperature and dew point."""
+
+    def __init__(self, MetarReport=None, reftime=None):
+        """
+        Set attribute Report as specified on instantation. As a METAR
+        only holds day and time of the observation, year and month are
+        taken from the observation time already set in the report or
+        from reftime (seconds since the epoch, default: now).
+        """
+        ReportParser.__init__(self, MetarReport)
+        self.reftime = reftime
+
+    def ParseReport(self, MetarReport=None):
+        """Take report with the raw METAR (in its code attribute or, if
+        that is not set, as fullreport) and return it with the parsed
+        values filled in. Note: This function edits the WeatherReport
+        object you supply!"""
+        if self.Report is None and MetarReport is None:
+            raise EmptyReportException(
+                "No report given on init and ParseReport().")
+        elif MetarReport is not None:
+            self.Report = MetarReport
+        report = self.Report
+
+        if report.code is None:
+            try:
+                text = report.fullreport.decode()
+            except UnicodeDecodeError:
+                raise GarbledReportException(
+                    "Report is not valid ASCII or Unicode.")
+            # Skip the date line of the NOAA's raw report files
+            report.code = " ".join(
+                line.strip() for line in text.split("\n")
+                if line.strip() and not _CYCLE_DATE_RE.match(line.encode()))
+
+        # Raw feeds often end each report with "="
+        report.code = report.code.rstrip().rstrip("=").rstrip()
+        tokens = tokenize_metar(report.code)
+        if report.givenstationid is None:
+            for (kind, group) in tokens:
+                if kind == "station":
+                    report.givenstationid = group
+
+        previous = None
+        trend = False
+        for (kind, group) in tokens:
+            if kind == "trend":
+                # Forecasts do not describe the observation, skip them
+                # up to the remarks
+                trend = True
+            elif kind == "remark":
+                trend = False
+            if trend:
+                continue
+            if kind == "time":
+                self._parseTime(group)
+            elif kind == "wind":
+                self._parseWind(group)
+            elif kind == "windvar":
+                (low, high) = group.split("V")
+                report.windvar = (int(low), int(high))
+            elif kind == "visibility" and report.vis is None:
+                if group.endswith("SM") or len(group) >= 4:
+                    if previous is None or not previous.isdigit():
+                        previous = None
+                    report.vis = _metar_visibility(group, previous)
+            elif kind == "cloud" and group == "CAVOK":
+                report.vis = _metar_visibility(group)
+            elif kind == "temperature":
+                (temp, dewp) = group.split("/")
+                report.temp = _metar_temperature(temp)
+                report.dewp = _metar_temperature(dewp)
+            elif kind == "altimeter":
+                if group[0] == "Q":
+                    report.press = float(group[1:])
+                    report.pressmmHg = report.press * 0.750062
+                else:
+                    inhg = float(group[1:]) / 100.0
+                    report.press = inhg * 33.863886
+                    report.pressmmHg = inhg * 25.4
+            elif kind == "remark":
+                # Temperature and dew point in tenths of a degree
+                match = _TENTHS_RE.match(group)
+                if match is not None:
+                    report.temp = _tenths_temperature(*match.group(1, 2))
+                    report.dewp = _tenths_temperature(*match.group(3, 4))
+            previous = group
+
+        if report.temp is not None:
+            report.tempf = report.temp * 1.8 + 32
+        if report.dewp is not None:
+            report.dewpf = report.dewp * 1.8 + 32
+            if report.temp is not None:
+                # Magnus formula
+                report.humid = int(round(100 * math.exp(
+                    17.625 * report.dewp / (243.04 + report.dewp) -
+                    17.625 * report.temp / (243.04 + report.temp))))
+
+        cover = None
+        for (kind, group) in tokens:
+            if kind in ("trend", "remark"):
+                break
+            if kind in ("cloud", "other") and group[:2] == "VV":
+                layer = _SKY_COVER["VV"]
+            elif kind == "cloud":
+                layer = _SKY_COVER.get(group[:3])
+            else:
+                continue
+            if layer is not None and (cover is None or layer > cover):
+                cover = layer
+        if cover is not None:
+            report.sky = cover[1]
+
+        return self._completeReport(tokens)
+
+    def _parseTime(self, group):
+        """Fill in observation time and cycle from e.g. "260850Z" """
+        report = self.Report
+        (day, hour, minute) = (int(group[:2]), int(group[2:4]),
+                               int(group[4:6]))
+        if report.rtime is None:
+            ref = time.gmtime(self.reftime)
+            (year, month) = (ref.tm_year, ref.tm_mon)
+            if day > ref.tm_mday + 1:
+                # Observation made in the previous month
+                month -= 1
+                if month == 0:
+                    (year, month) = (year - 1, 12)
+            report.rtime = "%04d.%02d.%02d %02d%02d UTC" % (
+                year, month, day, hour, minute)
+        # Cycles run from N:45 to N+1:45
+        report.cycle = (hour + (minute >= 45)) % 24
+
+    def _parseWind(self, group):
+        """Fill in wind direction and speed from e.g. "22008G15KT" """
+        report = self.Report
+        match = _WIND_RE.match(group)
+        (direction, speed, gust, unit) = match.groups()
+        if "/" in speed:
+            return
+        factor = _WIND_UNITS[unit]
+        report.windspeed = int(speed) * factor
+        report.windspeedkt = report.windspeed / _WIND_UNITS["KT"]
+        report.windspeedmph = report.windspeed / 0.44704
+        if gust is not None:
+            report.windgust = int(gust) * factor
+        if direction in ("VRB", "///") or report.windspeed == 0:
+            report.winddir = None
+            report.windcomp = None
+        else:
+            report.winddir = int(direction)
+            report.windcomp = _COMPASS[int(report.winddir / 22.5 + 0.5) % 16]
+
+
+def _split_timeout(timeout):
+    """
+    Return a tuple (connect timeout, read timeout) for a timeout given
+    as a number (used for both) or as such a tuple.
+    """
+    if isinstance(timeout, tuple):
+        return timeout
+    return (timeout, timeout)
+
+
+class _TimeoutHTTPConnection(http.client.HTTPConnection):
+
+    """HTTPConnection with separate timeouts for connecting and reading"""
+
+    def __init__(self, *args, readtimeout=None, **kwargs):
+        http.client.HTTPConnection.__init__(self, *args, **kwargs)
+        self.readtimeout = readtimeout
+
+    def connect(self):
+        http.client.HTTPConnection.connect(self)
+        self.sock.settimeout(self.readtimeout)
+
+
+class _TimeoutHTTPSConnection(http.client.HTTPSConnection):
+
+    """HTTPSConnection with separate timeouts for connecting and reading"""
+
+    def __init__(self, *args, readtimeout=None, **kwargs):
+        http.client.HTTPSConnection.__init__(self, *args, **kwargs)
+        self.readtimeout = readtimeout
+
+    def connect(self):
+        http.client.HTTPSConnection.connect(self)
+        self.sock.settimeout(self.readtimeout)
+
+
+class _TimeoutHTTPHandler(urllib.request.HTTPHandler):
+
+    """urllib handler using _TimeoutHTTPConnection"""
+
+    def __init__(self, readtimeout):
+        urllib.request.HTTPHandler.__init__(self)
+        self.readtimeout = readtimeout
+
+    def http_open(self, req):
+        return self.do_open(_TimeoutHTTPConnection, req,
+                            readtimeout=self.readtimeout)
+
+
+class _TimeoutHTTPSHandler(urllib.request.HTTPSHandler):
+
+    """urllib handler using _TimeoutHTTPSConnection"""
+
+    def __init__(self, readtimeout):
+        self.sslcontext = ssl.create_default_context()
+        urllib.request.HTTPSHandler.__init__(self, context=self.sslcontext)
+        self.readtimeout = readtimeout
+
+    def https_open(self, req):
+        return self.do_open(_TimeoutHTTPSConnection, req,
+                            context=self.sslcontext,
+                            readtimeout=self.readtimeout)
+
+
+def _build_opener(proxy=None, timeout=None):
+    """
+    Return a urllib opener using proxy or, if that is None, the proxy
+    given in the environment. If timeout is a tuple (connect timeout,
+    read timeout), the read timeout (None for none) replaces the timeout
+    given to open() once the connection is established.
+    """
+    if proxy:
+        handlers = [urllib.request.ProxyHandler(
+            {'http': proxy, 'https': proxy})]
+    else:
+        handlers = [urllib.request.ProxyHandler()]
+    if isinstance(timeout, tuple):
+        readtimeout = _split_timeout(timeout)[1]
+        handlers.extend([_TimeoutHTTPHandler(readtimeout),
+                         _TimeoutHTTPSHandler(readtimeout)])
+    return urllib.request.build_opener(*handlers)
+
+
+def _status_error(status, message):
+    """
+    Return a NetworkException for an HTTP error status, with the status
+    kept in its status attribute.
+    """
+    why = NetworkException(message)
+    why.status = status
+    return why
+
+
+class LatencyHistogram:
+
+    """A histogram of request latencies with logarithmic buckets, from
+       1 ms up to about 2 minutes. It is safe to use from several
+       threads."""
+
+    # Each bucket is 25% wider than the one before
+    FACTOR = 1.25
+    MINIMUM = 0.001
+    BUCKETS = 54
+
+    def __init__(self):
+        self.counts = [0] * (self.BUCKETS + 1)
+        self.count = 0
+        self.total = 0.0
+        self._lock = threading.Lock()
+
+    def Bounds(self):
+        """Return the list of upper bucket bounds in seconds"""
+        return [self.MINIMUM * self.FACTOR ** i for i in range(self.BUCKETS)]
+
+    def Record(self, seconds):
+        """Add a latency (in seconds) to the histogram"""
+        if seconds <= self.MINIMUM:
+            index = 0
+        else:
+            index = min(self.BUCKETS, int(math.ceil(
+                math.log(seconds / self.MINIMUM, self.FACTOR))))
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.total += seconds
+
+    def Percentile(self, percent):
+        """
+        Return the upper bound of the bucket holding the given percentile
+        (0-100) of all latencies recorded, or None if there are none.
+        """
+        with self._lock:
+            counts = list(self.counts)
+            count = self.count
+        if not count:
+            return None
+        wanted = count * percent / 100.0
+        seen = 0
+        for index, bucket in enumerate(counts):
+            seen += bucket
+            if seen >= wanted:
+                break
+        return self.MINIMUM * self.FACTOR ** index
+
+    def GetBuckets(self):
+        """
+        Return a list of (upper bound in seconds, count) tuples. The last
+        bucket (bound None) holds everything beyond the largest bound.
+        """
+        with self._lock:
+            counts = list(self.counts)
+        return list(zip(self.Bounds() + [None], counts))
+
+
+class ReportFetcher:
+
+    """Fetches a report from a given METAR id, optionally taking into
        account a different baseurl and using environment var-specified
        proxies."""
 
     def __init__(self, MetarStationCode=None,
                  baseurl="https://tgftp.nws.noaa.gov/data/observations/"
-                         "metar/decoded/"):
-        """Set stationid attribute and base URL to fetch report from"""
+                         "metar/decoded/",
+                 conditional=False, timeout=None, retries=0, backoff=0.5,
+                 hedge=False, hedgedelay=1.0, mirrors=()):
+        """
+        Set stationid attribute and base URL to fetch report from.
+
+        If conditional is True, the ETag and Last-Modified headers of
+        every report are remembered and sent along with the next request
+        for the same station. If the server answers "304 Not Modified",
+        the WeatherReport returned last time is returned again. As
+        ReportParser fills in the report it is given, that report keeps
+        its parsed values (and its valid attribute), so it need not be
+        parsed again.
+
+        timeout is the timeout in seconds for connecting and for every
+        read, or a tuple (connect timeout, read timeout). None means no
+        timeout. Failed requests (network errors, timeouts and server
+        errors, but not e.g. "404 Not Found") are retried up to retries
+        times, waiting a random time between 0 and backoff * 2**n
+        seconds before retry number n+1.
+
+        If hedge is True and a request has not been answered after the
+        95th percentile of the latencies seen so far (hedgedelay seconds
+        until enough requests have been made), a second request is sent
+        to the first of the base URLs in mirrors, or to baseurl again if
+        there are none, and also when the first request failed in a way
+        that retrying might fix. The first answer wins. The latencies are
+        available from GetLatencyHistogram(). Call close() to stop the
+        threads used for hedging.
+        """
         self.stationid = MetarStationCode
         self.baseurl = baseurl
+        self.conditional = conditional
+        self.savedrequests = 0
+        self._validators = {}
+        self._fetchlock = threading.Lock()
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.hedge = hedge
+        self.hedgedelay = hedgedelay
+        self.mirrors = list(mirrors)
+        self.latencies = LatencyHistogram()
+        self._random = random.Random()
+        self._hedgeexecutor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Stop the threads used for hedged requests, if any"""
+        with self._fetchlock:
+            executor, self._hedgeexecutor = self._hedgeexecutor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
 
     def MakeReport(self, StationID, RawReport):
         """
@@ -1081,45 +2777,1685 @@ class ReportFetcher:
         If no proxy is specified, the environment variable http_proxy
         is inspected. If it isn't set, a direct connection is tried.
         """
-        if self.stationid is None and StationCode is None:
+        if StationCode is None:
+            StationCode = self.stationid
+        if StationCode is None:
             raise EmptyIDException(
                 "No ID given on init and FetchReport().")
-        elif StationCode is not None:
-            self.stationid = StationCode
 
-        self.stationid = self.stationid.upper()
-        self.reporturl = "%s%s.TXT" % (self.baseurl, self.stationid)
+        # Work on local copies so a single fetcher can be shared by
+        # several threads; the attributes are only updated at the end.
+        stationid = StationCode.upper()
+        reporturl = "%s%s.TXT" % (self.baseurl, stationid)
+
+        headers = {}
+        cached = None
+        if self.conditional:
+            cached = self._validators.get(stationid)
+        if cached is not None:
+            (etag, lastmodified, _) = cached
+            if etag:
+                headers["If-None-Match"] = etag
+            if lastmodified:
+                headers["If-Modified-Since"] = lastmodified
 
-        if proxy:
-            p_dict = {'http': proxy}
-            p_handler = urllib.request.ProxyHandler(p_dict)
-            opener = urllib.request.build_opener(
-                p_handler, urllib.request.HTTPHandler)
-            urllib.request.install_opener(opener)
+        # Dump entire report in a variable
+        (reporturl, status, rheaders, fullreport) = self._retrieve(
+            stationid, proxy, headers)
+
+        if status == 304 and cached is not None:
+            report = cached[2]
+            fullreport = report.fullreport
+            with self._fetchlock:
+                self.savedrequests += 1
+        elif status == 304:
+            raise NetworkException(
+                "Could not fetch METAR report: 304 without a cached report")
+        else:
+            report = WeatherReport(stationid)
+            report.reporturl = reporturl
+            report.fullreport = fullreport
+            if self.conditional:
+                etag = rheaders.get("ETag")
+                lastmodified = rheaders.get("Last-Modified")
+                if etag or lastmodified:
+                    self._validators[stationid] = (etag, lastmodified, report)
+
+        self.stationid = stationid
+        self.reporturl = reporturl
+        self.fullreport = fullreport
+        self.report = report  # Caching it for GetReport()
+
+        return report
+
+    def _retrieve(self, stationid, proxy, headers):
+        """
+        Retrieve the report for stationid, hedging the request if asked
+        to. Return a tuple (URL, status, response headers, body).
+        """
+        urls = ["%s%s.TXT" % (baseurl, stationid)
+                for baseurl in [self.baseurl] + self.mirrors]
+        if not self.hedge:
+            return (urls[0],) + self._attempt(urls[0], proxy, headers)
+
+        if self.latencies.count >= 20:
+            delay = self.latencies.Percentile(95)
         else:
-            urllib.request.install_opener(
-                urllib.request.build_opener(urllib.request.ProxyHandler,
-                                            urllib.request.HTTPHandler))
+            delay = self.hedgedelay
+        with self._fetchlock:
+            if self._hedgeexecutor is None:
+                self._hedgeexecutor = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=64)
+        executor = self._hedgeexecutor
+
+        started = threading.Event()
+        future = executor.submit(self._timedAttempt, urls[0], proxy,
+                                 headers, started)
+        # Also wakes us up if the request is cancelled by close()
+        future.add_done_callback(lambda future: started.set())
+        futures = {future: urls[0]}
+        # Time spent waiting for a free thread is not the server's fault,
+        # the hedge delay runs from the start of the request
+        started.wait()
+        done, _ = concurrent.futures.wait(futures, timeout=delay)
+        if done:
+            # Answered in time: only hedge errors that may go away
+            error = next(iter(done)).exception()
+            if error is None or not self._retryable(error):
+                (seconds, result) = next(iter(done)).result()
+                self.latencies.Record(seconds)
+                return (urls[0],) + result
+        url = urls[1 % len(urls)]
+        futures[executor.submit(self._timedAttempt, url, proxy,
+                                headers)] = url
+
+        error = None
+        pending = set(futures)
+        while pending:
+            done, pending = concurrent.futures.wait(
+                pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    # Only the latency of the winning request counts
+                    (seconds, result) = future.result()
+                    self.latencies.Record(seconds)
+                    return (futures[future],) + result
+                error = future.exception()
+        raise error
+
+    @staticmethod
+    def _retryable(why):
+        """Return True if the NetworkException why may go away on retry"""
+        status = getattr(why, "status", None)
+        return not (status and status < 500)
+
+    def _attempt(self, url, proxy, headers):
+        """
+        Retrieve url with _open(), retrying as configured. Return
+        _open()'s result and record the latency of the request.
+        """
+        (seconds, result) = self._timedAttempt(url, proxy, headers)
+        self.latencies.Record(seconds)
+        return result
+
+    def _timedAttempt(self, url, proxy, headers, started=None):
+        """
+        Retrieve url with _open(), retrying as configured. Return a
+        tuple (latency of the successful request, _open()'s result).
+        The threading.Event started, if given, is set first.
+        """
+        if started is not None:
+            started.set()
+        attempt = 0
+        while True:
+            start = time.monotonic()
+            try:
+                result = self._open(url, proxy, headers)
+            except NetworkException as why:
+                if attempt >= self.retries or not self._retryable(why):
+                    raise
+                time.sleep(self._random.uniform(
+                    0, self.backoff * 2 ** attempt))
+                attempt += 1
+                continue
+            return (time.monotonic() - start, result)
+
+    def _open(self, url, proxy=None, headers=None):
+        """
+        Retrieve url, sending the extra request headers given as a dict.
+        Return a tuple (status, response headers, body as bytes).
+        Raise NetworkException if that fails or the server answers with
+        a status other than 200 or 304.
+        """
+        connecttimeout = _split_timeout(self.timeout)[0]
+        opener = _build_opener(proxy, self.timeout)
+        request = urllib.request.Request(url, headers=headers or {})
 
         try:
-            fn = urllib.request.urlopen(self.reporturl)
+            if connecttimeout is None:
+                fn = opener.open(request)
+            else:
+                fn = opener.open(request, timeout=connecttimeout)
+            body = fn.read()
         except urllib.error.HTTPError as why:
+            if why.code == 304:
+                return (304, why.headers, b"")
+            raise _status_error(why.code, str(why))
+        except (urllib.error.URLError, http.client.HTTPException,
+                OSError) as why:
             raise NetworkException(why)
 
-        # Dump entire report in a variable
-        self.fullreport = fn.read()
-
         if fn.status != 200:
             raise NetworkException(
                 "Could not fetch METAR report: %s" % (fn.status))
 
-        report = WeatherReport(self.stationid)
-        report.reporturl = self.reporturl
-        report.fullreport = self.fullreport
-        self.report = report  # Caching it for GetReport()
+        return (fn.status, fn.headers, body)
 
-        return report
+    def GetSavedRequests(self):
+        """
+        Return the number of requests answered with "304 Not Modified"
+        for which the cached report was returned instead of downloading
+        and parsing it again.
+        """
+        return self.savedrequests
+
+    def GetLatencyHistogram(self):
+        """
+        Return the LatencyHistogram of all successful requests made by
+        this fetcher.
+        """
+        return self.latencies
 
     def GetReport(self):
         """Get a previously fetched report again"""
         return self.report
+
+
+class _ConnectionPool:
+
+    """Idle persistent connections to a single host (or proxy)."""
+
+    def __init__(self, factory, size, idletimeout):
+        self.factory = factory
+        self.size = size
+        self.idletimeout = idletimeout
+        self.idle = []
+        self.lock = threading.Lock()
+
+    def get(self):
+        """
+        Return a tuple (connection, reused). Idle connections are handed
+        out most recently used first, expired ones are closed.
+        """
+        now = time.monotonic()
+        with self.lock:
+            while self.idle:
+                conn, since = self.idle.pop()
+                if now - since <= self.idletimeout:
+                    return (conn, True)
+                conn.close()
+        return (self.factory(), False)
+
+    def put(self, conn):
+        """Return a connection to the pool or close it if the pool is full"""
+        now = time.monotonic()
+        with self.lock:
+            while self.idle and now - self.idle[0][1] > self.idletimeout:
+                self.idle.pop(0)[0].close()
+            if len(self.idle) < self.size:
+                self.idle.append((conn, now))
+                return
+        conn.close()
+
+    def close(self):
+        """Close all idle connections"""
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for conn, _ in idle:
+            conn.close()
+
+
+class PersistentReportFetcher(ReportFetcher):
+
+    """Fetches reports just like ReportFetcher, but keeps a pool of
+       persistent HTTP/1.1 connections per host and reuses them across
+       FetchReport calls. Pool size, idle timeout and proxy are set once
+       when the fetcher is created. A single instance may be shared by
+       several threads."""
+
+    def __init__(self, MetarStationCode=None,
+                 baseurl="https://tgftp.nws.noaa.gov/data/observations/"
+                         "metar/decoded/",
+                 poolsize=4, idletimeout=30, proxy=None, **kwargs):
+        """
+        Set stationid attribute and base URL to fetch report from.
+        poolsize is the maximum number of idle connections kept per host,
+        idletimeout the number of seconds after which an idle connection
+        is no longer reused. proxy has the same format as for
+        ReportFetcher.FetchReport(), if it is None, the environment
+        variables are inspected. The other keyword arguments (conditional,
+        timeout, retries, ...) are the same as for ReportFetcher.
+        """
+        ReportFetcher.__init__(self, MetarStationCode, baseurl, **kwargs)
+        self.poolsize = poolsize
+        self.idletimeout = idletimeout
+        self.proxy = proxy
+        self._pools = {}
+        self._lock = threading.Lock()
+
+    def close(self):
+        """Close all pooled connections and stop the hedging threads"""
+        ReportFetcher.close(self)
+        with self._lock:
+            pools, self._pools = self._pools, {}
+        for pool in pools.values():
+            pool.close()
+
+    def _getpool(self, scheme, host, port, proxy):
+        """Return the pool for the given host and proxy, create if needed"""
+        key = (scheme, host, port, proxy)
+        with self._lock:
+            pool = self._pools.get(key)
+            if pool is None:
+                pool = _ConnectionPool(
+                    lambda: self._connect(scheme, host, port, proxy),
+                    self.poolsize, self.idletimeout)
+                self._pools[key] = pool
+        return pool
+
+    def _connect(self, scheme, host, port, proxy):
+        """Create a new (not yet connected) connection object"""
+        (connecttimeout, readtimeout) = _split_timeout(self.timeout)
+        if connecttimeout is None:
+            connecttimeout = socket.getdefaulttimeout()
+        if scheme == "https":
+            conncls = _TimeoutHTTPSConnection
+        else:
+            conncls = _TimeoutHTTPConnection
+        if proxy is None:
+            return conncls(host, port, timeout=connecttimeout,
+                           readtimeout=readtimeout)
+
+        pparts = urllib.parse.urlsplit(proxy)
+        if scheme == "https":
+            # Tunnel through the proxy with CONNECT
+            conn = _TimeoutHTTPSConnection(
+                pparts.hostname, pparts.port, timeout=connecttimeout,
+                readtimeout=readtimeout)
+            conn.set_tunnel(host, port, self._proxyheaders(proxy))
+            return conn
+        return _TimeoutHTTPConnection(
+            pparts.hostname, pparts.port, timeout=connecttimeout,
+            readtimeout=readtimeout)
+
+    @staticmethod
+    def _proxyheaders(proxy):
+        """Return the authentication headers needed for proxy, if any"""
+        pparts = urllib.parse.urlsplit(proxy)
+        if pparts.username is None:
+            return {}
+        creds = "%s:%s" % (urllib.parse.unquote(pparts.username),
+                           urllib.parse.unquote(pparts.password or ""))
+        return {"Proxy-Authorization":
+                "Basic %s" % base64.b64encode(creds.encode()).decode()}
+
+    def _getproxy(self, scheme, host, proxy):
+        """Return the proxy URL to use for host or None"""
+        if proxy:
+            return proxy
+        if self.proxy:
+            return self.proxy
+        if urllib.request.proxy_bypass(host):
+            return None
+        return urllib.request.getproxies().get(scheme)
+
+    def _open(self, url, proxy=None, headers=None):
+        """
+        Retrieve url over a pooled connection, sending the extra request
+        headers given as a dict. Return a tuple (status, response headers,
+        body as bytes). Raise NetworkException if that fails or the server
+        answers with a status other than 200 or 304.
+        """
+        parts = urllib.parse.urlsplit(url)
+        scheme = parts.scheme
+        host = parts.hostname
+        port = parts.port
+        proxy = self._getproxy(scheme, host, proxy)
+
+        target = parts.path or "/"
+        if parts.query:
+            target = "%s?%s" % (target, parts.query)
+        headers = dict(headers or {})
+        headers["User-Agent"] = "pymetar/%s" % __version__
+        if proxy is not None and scheme != "https":
+            # Plain HTTP proxies want the absolute URL
+            target = url
+            headers.update(self._proxyheaders(proxy))
+
+        pool = self._getpool(scheme, host, port, proxy)
+        while True:
+            conn, reused = pool.get()
+            try:
+                conn.request("GET", target, headers=headers)
+                resp = conn.getresponse()
+                body = resp.read()
+            except (http.client.HTTPException, OSError) as why:
+                conn.close()
+                if reused:
+                    # The server may have dropped the idle connection
+                    # in the meantime, try again with the next one.
+                    continue
+                raise NetworkException(why)
+            break
+
+        if resp.will_close:
+            conn.close()
+        else:
+            pool.put(conn)
+
+        if resp.status not in (200, 304):
+            raise _status_error(
+                resp.status, "Could not fetch METAR report: %s %s" %
+                (resp.status, resp.reason))
+
+        return (resp.status, resp.headers, body)
+
+
+class OfflineReportFetcher(ReportFetcher):
+
+    """Serves reports from a local directory of STATION.TXT files or from
+       a tar archive (optionally compressed, e.g. reports.tgz) instead of
+       the network. It can be used wherever a ReportFetcher is used, for
+       example to test or benchmark fetch pipelines and caches. Latency
+       and network errors can be simulated. Reports get an ETag, so
+       conditional fetching works as well."""
+
+    def __init__(self, source, subdir=None, MetarStationCode=None,
+                 baseurl="https://tgftp.nws.noaa.gov/data/observations/"
+                         "metar/decoded/",
+                 latency=0, errorrate=0.0, seed=None, **kwargs):
+        """
+        source is a directory or the file name of a tar archive. If the
+        archive (or directory) holds several sets of reports, subdir
+        selects the one to use, e.g. "reports/set-2017-07-29"; reading
+        an archive raises ValueError if a report file name is found more
+        than once.
+        latency is the simulated delay of every request in seconds,
+        either a number or a tuple (min, max) to pick a random delay
+        from. errorrate is the probability (0.0 to 1.0) of a request
+        failing with a NetworkException. seed initializes the random
+        number generator used for both. Requests delayed beyond the
+        read timeout fail like a timed out request would. The report URLs
+        are built from baseurl as usual. The other keyword arguments are
+        the same as for ReportFetcher.
+        """
+        ReportFetcher.__init__(self, MetarStationCode, baseurl, **kwargs)
+        self.latency = latency
+        self.errorrate = errorrate
+        self._random = random.Random(seed)
+        self._randomlock = threading.Lock()
+        self._reports = None
+        if os.path.isdir(source):
+            self.directory = os.path.join(source, subdir or "")
+        else:
+            self.directory = None
+            self._reports = self._readarchive(source, subdir)
+
+    @staticmethod
+    def _readarchive(source, subdir):
+        """
+        Read all reports below subdir from the tar archive source into
+        a dict keyed by file name. Compressed archives can not be read
+        at random cheaply, so the archive is read once, front to back.
+        Raise ValueError if a file name appears more than once.
+        """
+        prefix = subdir.strip("/") + "/" if subdir else ""
+        reports = {}
+        with tarfile.open(source, "r:*") as archive:
+            for member in archive:
+                name = member.name
+                if name.startswith("./"):
+                    name = name[2:]
+                if not member.isfile() or not name.startswith(prefix):
+                    continue
+                fname = name.rsplit("/", 1)[-1].upper()
+                if not fname.endswith(".TXT"):
+                    continue
+                if fname in reports:
+                    raise ValueError(
+                        "%s holds %s more than once, select a set of "
+                        "reports with subdir" % (source, fname))
+                reports[fname] = archive.extractfile(member).read()
+        return reports
+
+    def Stations(self):
+        """Return a sorted list of the station IDs that are available"""
+        if self._reports is not None:
+            names = self._reports
+        else:
+            names = [n.upper() for n in os.listdir(self.directory)]
+        return sorted(n[:-4] for n in names if n.endswith(".TXT"))
+
+    def _open(self, url, proxy=None, headers=None):
+        """
+        Look up the report for url (only its file name is used) and
+        return a tuple (status, response headers, body), simulating
+        latency and errors as configured.
+        """
+        with self._randomlock:
+            if isinstance(self.latency, tuple):
+                delay = self._random.uniform(*self.latency)
+            else:
+                delay = self.latency
+            failed = self._random.random() < self.errorrate
+        readtimeout = _split_timeout(self.timeout)[1]
+        if readtimeout is not None and delay > readtimeout:
+            time.sleep(readtimeout)
+            raise NetworkException("Simulated timeout for %s" % url)
+        if delay:
+            time.sleep(delay)
+        if failed:
+            raise NetworkException("Simulated network error for %s" % url)
+
+        fname = urllib.parse.urlsplit(url).path.rsplit("/", 1)[-1]
+        if self._reports is not None:
+            body = self._reports.get(fname.upper())
+        else:
+            try:
+                with open(os.path.join(self.directory, fname), "rb") as fd:
+                    body = fd.read()
+            except OSError:
+                body = None
+        if body is None:
+            raise _status_error(404, "HTTP Error 404: Not Found (%s)" % url)
+
+        rheaders = http.client.HTTPMessage()
+        etag = '"%08x"' % zlib.crc32(body)
+        rheaders["ETag"] = etag
+        if headers and headers.get("If-None-Match") == etag:
+            return (304, rheaders, b"")
+        return (200, rheaders, body)
+
+
+class _AsyncConnection:
+
+    """A minimal persistent HTTP/1.1 client connection for asyncio."""
+
+    def __init__(self, scheme, host, port):
+        self.scheme = scheme
+        self.host = host
+        self.port = port or (443 if scheme == "https" else 80)
+        self.reader = None
+        self.writer = None
+
+    async def _connect(self):
+        if self.scheme == "https":
+            sslctx = ssl.create_default_context()
+        else:
+            sslctx = None
+        self.reader, self.writer = await asyncio.open_connection(
+            self.host, self.port, ssl=sslctx)
+
+    def close(self):
+        """Close the connection, it will be reopened on the next request"""
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+    async def request(self, target, headers=None):
+        """
+        Send a GET request for target and return a tuple (status, reason,
+        headers, body). Headers are returned as a dict with lowercase
+        names. An idle connection that was closed by the server is
+        reopened once.
+        """
+        reused = self.writer is not None
+        if not reused:
+            await self._connect()
+        try:
+            return await self._request(target, headers or {})
+        except (ConnectionError, asyncio.IncompleteReadError):
+            self.close()
+            if not reused:
+                raise
+        await self._connect()
+        return await self._request(target, headers or {})
+
+    async def _request(self, target, headers):
+        lines = ["GET %s HTTP/1.1" % target, "Host: %s" % self.host,
+                 "User-Agent: pymetar/%s" % __version__]
+        lines.extend("%s: %s" % item for item in headers.items())
+        self.writer.write(("\r\n".join(lines) + "\r\n\r\n").encode())
+        await self.writer.drain()
+
+        statusline = await self.reader.readline()
+        if not statusline:
+            raise ConnectionResetError("Connection closed by server")
+        try:
+            _, status, reason = statusline.decode("latin-1").split(" ", 2)
+            status = int(status)
+        except ValueError:
+            raise http.client.BadStatusLine(statusline)
+        rheaders = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, value = line.decode("latin-1").split(":", 1)
+            rheaders[name.strip().lower()] = value.strip()
+
+        if rheaders.get("transfer-encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int((await self.reader.readline()).split(b";")[0], 16)
+                if size == 0:
+                    # Skip the (usually empty) trailer
+                    while (await self.reader.readline()) not in (
+                            b"\r\n", b"\n", b""):
+                        pass
+                    break
+                chunks.append(await self.reader.readexactly(size))
+                await self.reader.readline()
+            body = b"".join(chunks)
+        elif "content-length" in rheaders:
+            body = await self.reader.readexactly(
+                int(rheaders["content-length"]))
+        else:
+            body = await self.reader.read()
+            rheaders["connection"] = "close"
+
+        if rheaders.get("connection", "").lower() == "close":
+            self.close()
+        return (status, reason.strip(), rheaders, body)
+
+
+class AsyncReportFetcher:
+
+    """Fetches reports concurrently using asyncio. The same URL scheme
+       as for ReportFetcher is used (baseurl + STATION.TXT). Connections
+       are kept open and reused for consecutive requests. Proxies are not
+       supported."""
+
+    def __init__(self,
+                 baseurl="https://tgftp.nws.noaa.gov/data/observations/"
+                         "metar/decoded/",
+                 concurrency=20, timeout=30):
+        """
+        Set base URL to fetch reports from, the maximum number of
+        concurrent requests made by fetch_many() and the timeout in
+        seconds for a single request (None for no timeout).
+        """
+        self.baseurl = baseurl
+        self.concurrency = concurrency
+        self.timeout = timeout
+
+    def _reporturl(self, StationCode):
+        """Return (station id, report URL) for a station code"""
+        if not StationCode:
+            raise EmptyIDException("No ID given to fetch.")
+        stationid = StationCode.upper()
+        return (stationid, "%s%s.TXT" % (self.baseurl, stationid))
+
+    async def _fetch(self, conns, StationCode):
+        """Fetch one report using (and filling) the connection dict conns"""
+        stationid, reporturl = self._reporturl(StationCode)
+        parts = urllib.parse.urlsplit(reporturl)
+        key = (parts.scheme, parts.hostname, parts.port)
+        conn = conns.get(key)
+        if conn is None:
+            conn = conns[key] = _AsyncConnection(*key)
+
+        target = parts.path or "/"
+        if parts.query:
+            target = "%s?%s" % (target, parts.query)
+        try:
+            status, reason, _, body = await asyncio.wait_for(
+                conn.request(target), self.timeout)
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError,
+                http.client.HTTPException, ValueError) as why:
+            conn.close()
+            raise NetworkException(
+                "Could not fetch METAR report: %s" % (why or repr(why)))
+        if status != 200:
+            raise NetworkException(
+                "Could not fetch METAR report: %s %s" % (status, reason))
+
+        report = WeatherReport(stationid)
+        report.reporturl = reporturl
+        report.fullreport = body
+        return report
+
+    async def fetch(self, StationCode, parse=False):
+        """
+        Fetch the report for a single station and return it as a
+        WeatherReport object. If parse is True, it is run through
+        ReportParser before it is returned.
+        """
+        conns = {}
+        try:
+            report = await self._fetch(conns, StationCode)
+        finally:
+            for conn in conns.values():
+                conn.close()
+        if parse:
+            report = ReportParser().ParseReport(report)
+        return report
+
+    async def fetch_many(self, stations, parse=True):
+        """
+        Fetch the reports for all stations in the iterable stations,
+        with up to self.concurrency requests in flight. This is an async
+        generator yielding (station, result) tuples in the order the
+        results come in. result is the WeatherReport (parsed, unless parse
+        is False) or the exception (NetworkException,
+        GarbledReportException, ...) that occurred for that station.
+        """
+        todo = asyncio.Queue()
+        count = 0
+        for station in stations:
+            todo.put_nowait(station)
+            count += 1
+        done = asyncio.Queue()
+
+        async def worker():
+            conns = {}
+            parser = ReportParser()
+            try:
+                while True:
+                    try:
+                        station = todo.get_nowait()
+                    except asyncio.QueueEmpty:
+                        return
+                    try:
+                        result = await self._fetch(conns, station)
+                        if parse:
+                            result = parser.ParseReport(result)
+                    except asyncio.CancelledError:
+                        raise
+                    except Exception as why:
+                        result = why
+                    done.put_nowait((station, result))
+            finally:
+                for conn in conns.values():
+                    conn.close()
+
+        workers = [asyncio.ensure_future(worker())
+                   for _ in range(max(1, min(self.concurrency, count)))]
+        try:
+            for _ in range(count):
+                yield await done.get()
+        finally:
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+
+def _fetch_and_parse(fetcher, station):
+    """Fetch and parse the report for station, used by fetch_reports()"""
+    report = fetcher.FetchReport(station)
+    if report.valid:
+        # Unchanged report returned by a conditional fetcher
+        return report
+    try:
+        return ReportParser().ParseReport(report)
+    except (ValueError, IndexError) as why:
+        raise GarbledReportException(
+            "Could not parse report for %s: %s" % (station, why))
+
+
+def _close_when_done(fetcher, futures):
+    """
+    Close fetcher once all futures are done or cancelled, so that workers
+    still running after fetch_reports() returned can put their
+    connections back into its pools.
+    """
+    remaining = [len(futures)]
+    lock = threading.Lock()
+
+    def finished(future):
+        with lock:
+            remaining[0] -= 1
+            last = remaining[0] == 0
+        if last:
+            fetcher.close()
+
+    if not futures:
+        fetcher.close()
+    for future in futures:
+        future.add_done_callback(finished)
+
+
+def fetch_reports(stations, workers=8, deadline=None, fetcher=None):
+    """
+    Fetch and parse the reports for all stations in the iterable stations
+    using a pool of worker threads. Return a dict mapping each station to
+    either its parsed WeatherReport or the exception (NetworkException,
+    GarbledReportException, EmptyIDException, ...) raised for it, so one
+    bad station does not abort the whole batch.
+    deadline is the number of seconds after which the batch is cut short:
+    stations that have not been handled by then map to a NetworkException
+    and the partial result is returned right away.
+    fetcher is the ReportFetcher (or subclass) to use. It is shared by all
+    workers. By default a PersistentReportFetcher is used, with deadline
+    as its timeout, which is closed once its workers are done.
+    """
+    if deadline is not None:
+        deadline_at = time.monotonic() + deadline
+    owned = fetcher is None
+    if owned:
+        fetcher = PersistentReportFetcher(poolsize=workers, timeout=deadline)
+    stations = list(stations)
+    results = {}
+    futures = {}
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+    try:
+        futures = {executor.submit(_fetch_and_parse, fetcher, station):
+                   station for station in stations}
+        timeout = None
+        if deadline is not None:
+            timeout = max(0, deadline_at - time.monotonic())
+        done, _ = concurrent.futures.wait(futures, timeout=timeout)
+        for future in done:
+            try:
+                results[futures[future]] = future.result()
+            except Exception as why:
+                results[futures[future]] = why
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+        if owned:
+            _close_when_done(fetcher, futures)
+
+    for station in stations:
+        if station not in results:
+            results[station] = NetworkException(
+                "Deadline of %ss exceeded before the report for %s was "
+                "fetched" % (deadline, station))
+    return results
+
+
+# The WeatherReport attributes kept by parse_many(), in tuple order.
+# The full report text and the tokens are left out to keep results small.
+COMPACT_FIELDS = (
+    "givenstationid", "code", "rtime", "cycle", "temp", "tempf", "dewp",
+    "dewpf", "humid", "windspeed", "windspeedmph", "winddir", "windcomp",
+    "windgust", "windvar", "vis", "press", "pressmmHg", "weather", "sky",
+    "cloudinfo", "conditions", "cloudtype", "pixmap", "fulln",
+    "stat_city", "stat_country", "latitude", "longitude", "latf", "longf",
+    "altitude")
+
+
+def _parse_chunk(chunk, raw):
+    """
+    Parse a list of (station, report) pairs in a worker process and
+    return a list with a tuple of the COMPACT_FIELDS values or the
+    GarbledReportException for each report.
+    """
+    if raw:
+        parser = RawReportParser()
+    else:
+        parser = ReportParser()
+    results = []
+    for (station, text) in chunk:
+        if station is None and not raw:
+            station = _report_station(text)
+            if station is None:
+                results.append(GarbledReportException(
+                    "Report lacks the station ID."))
+                continue
+        report = WeatherReport(station)
+        report.fullreport = text
+        try:
+            parser.ParseReport(report)
+        except GarbledReportException as why:
+            results.append(why)
+            continue
+        except (ValueError, IndexError) as why:
+            results.append(GarbledReportException(
+                "Report of %s could not be parsed: %s" % (station, why)))
+            continue
+        results.append(tuple([getattr(report, name)
+                              for name in COMPACT_FIELDS]))
+    return results
+
+
+def expand_report(values):
+    """
+    Turn a tuple of COMPACT_FIELDS values returned by parse_many() back
+    into a WeatherReport.
+    """
+    report = WeatherReport()
+    for (name, value) in zip(COMPACT_FIELDS, values):
+        setattr(report, name, value)
+    report.valid = 1
+    return report
+
+
+def parse_many(reports, processes=None, chunksize=256, ordered=True,
+               raw=False):
+    """
+    Parse many reports using a pool of worker processes, e.g. to re-parse
+    an archive. reports is an iterable of the report contents (bytes, as
+    read from a NOAA report file) or of (station, contents) pairs. For
+    bare contents, the station is taken from the first line of the
+    report. reports is consumed lazily, in chunks of chunksize reports.
+    Yield a tuple of the COMPACT_FIELDS values (see expand_report()) or
+    the GarbledReportException for each report, in the order of reports
+    if ordered is true and else as soon as they are parsed.
+    processes defaults to the number of CPUs. raw selects RawReportParser,
+    for reports that consist of the encoded report only.
+    """
+    def chunks():
+        chunk = []
+        for item in reports:
+            if isinstance(item, (bytes, bytearray)):
+                item = (None, bytes(item))
+            chunk.append(item)
+            if len(chunk) == chunksize:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    if processes is None:
+        processes = os.cpu_count() or 1
+    executor = concurrent.futures.ProcessPoolExecutor(max_workers=processes)
+    # Keep a few chunks per worker in flight, so memory use is bounded
+    inflight = 2 * processes
+    pending = []
+    try:
+        for chunk in chunks():
+            pending.append(executor.submit(_parse_chunk, chunk, raw))
+            while len(pending) >= inflight:
+                if ordered:
+                    yield from pending.pop(0).result()
+                    continue
+                (done, _) = concurrent.futures.wait(
+                    pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    pending.remove(future)
+                    yield from future.result()
+        if ordered:
+            for future in pending:
+                yield from future.result()
+        else:
+            for future in concurrent.futures.as_completed(pending):
+                yield from future.result()
+        pending = []
+    finally:
+        executor.shutdown(wait=not pending, cancel_futures=True)
+
+
+class PollScheduler:
+
+    """Decides when to fetch the report of each station next. The
+       observation times (rtime) of the recent reports of a station are
+       used to learn its update cadence: the period and the minute at
+       which routine reports are made. Extra off-schedule reports (SPECI)
+       are recognized and do not disturb that estimate. The next fetch
+       is then scheduled shortly after the next routine report is
+       expected instead of at a fixed interval. Typical use:
+
+       while True:
+           for station in scheduler.DueStations():
+               scheduler.Update(fetch_and_parse(station))
+           time.sleep(scheduler.TimeToNext())
+       """
+
+    # Candidate periods between routine reports (seconds)
+    PERIODS = (1800, 3600, 10800)
+    # Tolerance when matching an observation to the routine schedule
+    SLACK = 180
+
+    def __init__(self, delay=300, interval=3600, retry=300, history=8,
+                 clock=time.time):
+        """
+        delay: seconds after the expected observation time at which the
+        station is fetched (reports take a few minutes to show up).
+        interval: polling interval for stations whose cadence is not
+        known yet.
+        retry: initial interval for re-fetching a station whose expected
+        report has not shown up yet; doubled on every miss up to interval.
+        history: number of observation times kept per station.
+        clock: function returning the current time in seconds since the
+        epoch, replace it with a fake clock for testing.
+        """
+        self.delay = delay
+        self.interval = interval
+        self.retry = retry
+        self.history = history
+        self.clock = clock
+        self._obs = {}
+        self._misses = {}
+        self._next = {}
+        self._heap = []
+        self._lock = threading.Lock()
+
+    def _schedule(self, station, when):
+        """Set the next fetch time of station"""
+        with self._lock:
+            self._next[station] = when
+            heapq.heappush(self._heap, (when, station))
+        return when
+
+    def AddStation(self, station, when=None):
+        """Add a station, to be fetched at when (default: now)"""
+        if when is None:
+            when = self.clock()
+        return self._schedule(station, when)
+
+    def NextPoll(self, station):
+        """Return the time station is to be fetched next or None"""
+        return self._next.get(station)
+
+    def DueStations(self):
+        """
+        Return the list of stations that are due now. They are not
+        scheduled again until Update() or Failed() is called for them.
+        """
+        now = self.clock()
+        due = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                (when, station) = heapq.heappop(self._heap)
+                if self._next.get(station) == when:
+                    del self._next[station]
+                    due.append(station)
+        return due
+
+    def TimeToNext(self):
+        """Return the number of seconds until the next station is due"""
+        with self._lock:
+            while self._heap and \
+                    self._next.get(self._heap[0][1]) != self._heap[0][0]:
+                heapq.heappop(self._heap)
+            if not self._heap:
+                return None
+            return max(0, self._heap[0][0] - self.clock())
+
+    def GetCadence(self, station):
+        """
+        Return a tuple (period, phase) describing when routine reports
+        of station are made: at all times t with t % period == phase.
+        Return None if not enough reports have been seen yet.
+        """
+        obs = self._obs.get(station)
+        if not obs or len(obs) < 3:
+            return None
+
+        best = None
+        for period in self.PERIODS:
+            # The most common phase, allowing for a few minutes of jitter
+            phases = [t % period for t in obs]
+            counts = []
+            for phase in phases:
+                matching = [p for p in phases
+                            if min(abs(p - phase),
+                                   period - abs(p - phase)) <= self.SLACK]
+                counts.append((len(matching), phase))
+            count, phase = max(counts)
+            # Longer periods win ties: a shorter period explaining the
+            # same reports would predict reports that never come.
+            if best is None or count >= best[0]:
+                best = (count, period, phase)
+        return best[1:]
+
+    def Update(self, report, station=None):
+        """
+        Record a freshly fetched (and parsed) report and schedule the
+        next fetch of its station. station defaults to the station ID
+        of the report. Return the time of the next fetch.
+        """
+        if station is None:
+            station = report.givenstationid
+        now = self.clock()
+        obstime = metar_to_epoch(report.getTime())
+        if obstime is None:
+            return self._schedule(station, now + self.interval)
+
+        obs = self._obs.setdefault(station, [])
+        if obstime not in obs:
+            obs.append(obstime)
+            obs.sort()
+            del obs[:-self.history]
+            if obstime == obs[-1]:
+                self._misses[station] = 0
+                return self._schedule(station, self._expected(station, now))
+
+        # Nothing new: the expected report is late, check back soon.
+        misses = self._misses.get(station, 0)
+        self._misses[station] = misses + 1
+        return self._schedule(
+            station, now + min(self.retry * 2 ** misses, self.interval))
+
+    def Failed(self, station):
+        """
+        Record that fetching station failed and schedule a retry.
+        Return the time of the next fetch.
+        """
+        now = self.clock()
+        misses = self._misses.get(station, 0)
+        self._misses[station] = misses + 1
+        return self._schedule(
+            station, now + min(self.retry * 2 ** misses, self.interval))
+
+    def _expected(self, station, now):
+        """Return the time of the fetch for the next routine report"""
+        last = self._obs[station][-1]
+        cadence = self.GetCadence(station)
+        if cadence is None:
+            return max(last + self.interval + self.delay, now + self.retry)
+        (period, phase) = cadence
+        expected = last - last % period + phase
+        while expected <= last + self.SLACK:
+            expected += period
+        return max(expected + self.delay, now)
+
+
+_CYCLE_DATE_RE = re.compile(
+    rb"^([0-9]{4})/([0-9]{2})/([0-9]{2}) ([0-9]{2}):([0-9]{2})$")
+_METAR_TIME_RE = re.compile(r"^([0-9]{2})([0-9]{2})([0-9]{2})Z$")
+
+
+def _iter_cycle_entries(lines):
+    """
+    Split the lines (bytes) of a cycle file into entries. Each entry
+    starts with a line holding the date (YYYY/MM/DD HH:MM) followed by
+    the METAR, which may be wrapped over several lines. Yield tuples
+    (date match, METAR as str, raw entry as bytes).
+    """
+    date = None
+    raw = []
+    for line in lines:
+        line = line.rstrip(b"\r\n")
+        match = _CYCLE_DATE_RE.match(line)
+        if match is not None or not line.strip():
+            if date is not None and len(raw) > 1:
+                metar = b" ".join(part.strip() for part in raw[1:])
+                yield (date, metar.decode("ascii", "replace"),
+                       b"\n".join(raw) + b"\n")
+            date = match
+            raw = [line] if match is not None else []
+        elif date is not None:
+            raw.append(line)
+    if date is not None and len(raw) > 1:
+        metar = b" ".join(part.strip() for part in raw[1:])
+        yield (date, metar.decode("ascii", "replace"), b"\n".join(raw) + b"\n")
+
+
+def _cycle_entry_time(date, metar):
+    """
+    Return the observation time of a cycle file entry as a tuple
+    (year, month, day, hour, minute). The day and time come from the
+    METAR itself, year and month from the date line of the entry.
+    """
+    (year, month, day, hour, minute) = [int(i) for i in date.groups()]
+    for group in metar.split()[1:3]:
+        match = _METAR_TIME_RE.match(group)
+        if match is None:
+            continue
+        (oday, ohour, ominute) = [int(i) for i in match.groups()]
+        if oday > day + 1:
+            # Observation made in the previous month
+            month -= 1
+            if month == 0:
+                (year, month) = (year - 1, 12)
+        return (year, month, oday, ohour, ominute)
+    return (year, month, day, hour, minute)
+
+
+class CycleFileReader:
+
+    """Reads the hourly cycle files published by the NOAA. Each of them
+       holds the raw METARs of all stations received in one cycle, so a
+       single download refreshes every station. Cycle files hold no
+       decoded report, so the reports are parsed with RawReportParser
+       and have no station name and position. A station may appear more
+       than once in a cycle file, later entries are more recent."""
+
+    def __init__(self,
+                 baseurl="https://tgftp.nws.noaa.gov/data/observations/"
+                         "metar/cycles/"):
+        """Set base URL to fetch cycle files from"""
+        self.baseurl = baseurl
+        self._offsets = {}
+
+    def ReadCycle(self, cycle, proxy=None):
+        """
+        Fetch the cycle file for cycle (0-23) and yield a WeatherReport
+        object per entry while it is downloaded. For proxy, see
+        ReportFetcher.FetchReport().
+        """
+        url = "%s%02dZ.TXT" % (self.baseurl, cycle)
+        try:
+            fn = _build_opener(proxy).open(url)
+        except (urllib.error.URLError, http.client.HTTPException,
+                OSError) as why:
+            raise NetworkException(why)
+        with fn:
+            try:
+                yield from self._readlines(fn, url)
+            except (http.client.HTTPException, OSError) as why:
+                raise NetworkException(why)
+
+    def FollowCycle(self, cycle, proxy=None):
+        """
+        Fetch only the part of the cycle file for cycle that was added
+        since the last call and return a generator yielding a
+        WeatherReport object for each new entry. The number of bytes
+        already consumed is remembered per cycle file and only the rest
+        is requested (Range: bytes=N-). If the server ignores the range,
+        the whole file is downloaded and the part already seen is
+        skipped. Only complete entries (followed by a blank line) are
+        consumed, the others are picked up by the next call. A file that
+        shrank is assumed to have been replaced and is read from the
+        start; call ResetCycle() when a new hour begins to be sure.
+        """
+        url = "%s%02dZ.TXT" % (self.baseurl, cycle)
+        offset = self._offsets.get(url, 0)
+        headers = {}
+        if offset:
+            headers["Range"] = "bytes=%d-" % offset
+        request = urllib.request.Request(url, headers=headers)
+
+        try:
+            fn = _build_opener(proxy).open(request)
+            status = fn.status
+            crange = fn.headers.get("Content-Range")
+            body = fn.read()
+        except urllib.error.HTTPError as why:
+            if why.code != 416:
+                raise NetworkException(why)
+            # Nothing beyond offset, unless the file was replaced by
+            # a shorter one.
+            size = why.headers.get("Content-Range", "").rpartition("/")[2]
+            if size.isdigit() and int(size) < offset:
+                self._offsets[url] = 0
+                return self.FollowCycle(cycle, proxy)
+            return iter(())
+        except (urllib.error.URLError, http.client.HTTPException,
+                OSError) as why:
+            raise NetworkException(why)
+
+        if status == 206 and crange is not None:
+            # Content-Range: bytes START-END/SIZE
+            try:
+                start = int(crange.split()[1].split("-")[0])
+            except (IndexError, ValueError):
+                raise NetworkException(
+                    "Invalid Content-Range header: %s" % crange)
+            size = crange.rpartition("/")[2]
+            if size.isdigit() and int(size) < offset:
+                start = 0
+        elif offset and len(body) >= offset:
+            # Range ignored, skip what we have seen already
+            body = body[offset:]
+            start = offset
+        else:
+            start = 0
+
+        consumed = body.rfind(b"\n\n") + 2
+        if consumed < 2:
+            consumed = 0
+        self._offsets[url] = start + consumed
+        return self._readlines(body[:consumed].splitlines(True), url)
+
+    def ResetCycle(self, cycle):
+        """Forget how much of the cycle file for cycle was consumed"""
+        self._offsets.pop("%s%02dZ.TXT" % (self.baseurl, cycle), None)
+
+    def ReadFile(self, source):
+        """
+        Yield a WeatherReport object per entry of a cycle file. source
+        is a file name or a file object opened in binary mode.
+        """
+        if isinstance(source, (str, bytes, os.PathLike)):
+            with open(source, "rb") as fd:
+                yield from self._readlines(fd, os.fsdecode(source))
+        else:
+            yield from self._readlines(source, getattr(source, "name", None))
+
+    def _readlines(self, lines, url):
+        """Turn the lines of a cycle file into WeatherReport objects"""
+        parser = RawReportParser()
+        for (date, metar, raw) in _iter_cycle_entries(lines):
+            report = self._makeReport(date, metar, raw)
+            if report is None:
+                continue
+            report.reporturl = url
+            yield parser.ParseReport(report)
+
+    @staticmethod
+    def _makeReport(date, metar, raw):
+        """Return an unparsed WeatherReport for a cycle file entry"""
+        groups = metar.split()
+        if groups and groups[0] in ("METAR", "SPECI"):
+            groups = groups[1:]
+            metar = " ".join(groups)
+        if not groups:
+            return None
+        report = WeatherReport(groups[0])
+        report.fullreport = raw
+        report.code = metar
+        (year, month, day, hour, minute) = _cycle_entry_time(date, metar)
+        report.rtime = "%04d.%02d.%02d %02d%02d UTC" % (
+            year, month, day, hour, minute)
+        # Cycles run from N:45 to N+1:45
+        report.cycle = (hour + (minute >= 45)) % 24
+        return report
+
+
+def _is_archive(head):
+    """Tell from the first bytes of a stream whether it is a tar archive"""
+    return (head[:2] == b"\x1f\x8b" or head[:3] == b"BZh" or
+            head[:6] == b"\xfd7zXZ\x00" or head[257:262] == b"ustar")
+
+
+def _iter_stream(fd, name, strict):
+    """
+    Yield the reports of the binary stream fd, which holds a tar archive,
+    a cycle file (or raw report file) or a single decoded report.
+    """
+    if not hasattr(fd, "peek"):
+        fd = io.BufferedReader(fd)
+    head = fd.peek(512)
+    if _is_archive(head):
+        # Stream mode, members are read front to back without seeking
+        with tarfile.open(fileobj=fd, mode="r|*") as archive:
+            for member in archive:
+                if member.isfile() and member.name.upper().endswith(".TXT"):
+                    yield from _iter_stream(archive.extractfile(member),
+                                            member.name, strict)
+        return
+
+    if _CYCLE_DATE_RE.match(head.split(b"\n", 1)[0].rstrip(b"\r")):
+        parser = RawReportParser()
+        for (date, metar, raw) in _iter_cycle_entries(fd):
+            report = CycleFileReader._makeReport(date, metar, raw)
+            if report is None:
+                continue
+            report.reporturl = name
+            try:
+                yield parser.ParseReport(report)
+            except (GarbledReportException, ValueError, IndexError):
+                if strict:
+                    raise
+        return
+
+    station = None
+    if name:
+        station = os.path.basename(name)
+        if station.upper().endswith(".TXT"):
+            station = station[:-4]
+    text = fd.read()
+    if station is None:
+        # Nameless stream, take the ID from the station line
+        station = _report_station(text)
+    report = WeatherReport(station)
+    report.reporturl = name
+    report.fullreport = text
+    try:
+        if station is None:
+            raise GarbledReportException("Report lacks the station ID.")
+        yield ReportParser().ParseReport(report)
+    except (GarbledReportException, ValueError, IndexError):
+        if strict:
+            raise
+
+
+def iter_reports(source, strict=False):
+    """
+    Yield a parsed WeatherReport for every report found in source, one
+    at a time, so that archives of any size can be processed in constant
+    memory. source is a directory holding report files (in any of its
+    subdirectories, in sorted order), the name of a file or a file
+    object opened in binary mode. Files may be NOAA report
+    files (decoded or raw), cycle files, or tar archives (compressed or
+    not) of those, which are read as a stream without extracting them.
+    Reports that can not be parsed are skipped, unless strict is true.
+    """
+    if not isinstance(source, (str, bytes, os.PathLike)):
+        yield from _iter_stream(source, getattr(source, "name", None),
+                                strict)
+    elif os.path.isdir(source):
+        for (directory, subdirs, names) in os.walk(source):
+            subdirs.sort()
+            for name in sorted(names):
+                path = os.path.join(directory, name)
+                if os.path.isfile(path):
+                    yield from iter_reports(path, strict)
+    else:
+        with open(source, "rb") as fd:
+            yield from _iter_stream(fd, os.fsdecode(source), strict)
+
+
+class _Flight:
+
+    """A fetch in progress that other callers may wait for."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class CoalescingFetcher:
+
+    """Fetches and parses reports for many threads at once. Concurrent
+       callers asking for the same station share a single fetch and
+       parse and all get the same WeatherReport object (or exception).
+       As that object is shared, it should not be modified."""
+
+    def __init__(self, fetcher=None):
+        """
+        fetcher is the ReportFetcher (or subclass) used, by default a
+        PersistentReportFetcher. It is called from several threads.
+        """
+        if fetcher is None:
+            fetcher = PersistentReportFetcher()
+        self.fetcher = fetcher
+        self.coalesced = 0
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def FetchReport(self, StationCode):
+        """
+        Return the parsed WeatherReport for StationCode, joining a fetch
+        of the same station already in progress, if any.
+        """
+        if not StationCode:
+            raise EmptyIDException("No ID given to FetchReport().")
+        stationid = StationCode.upper()
+        with self._lock:
+            flight = self._inflight.get(stationid)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[stationid] = _Flight()
+            else:
+                self.coalesced += 1
+
+        if leader:
+            try:
+                flight.result = _fetch_and_parse(self.fetcher, stationid)
+            except Exception as why:
+                flight.error = why
+            finally:
+                with self._lock:
+                    del self._inflight[stationid]
+                flight.done.set()
+        else:
+            flight.done.wait()
+
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+
+    def GetCoalescedRequests(self):
+        """Return the number of calls that joined a fetch in progress"""
+        return self.coalesced
+
+
+class AsyncCoalescingFetcher:
+
+    """The asyncio counterpart of CoalescingFetcher: concurrent
+       coroutines asking for the same station share a single fetch and
+       parse done by an AsyncReportFetcher."""
+
+    def __init__(self, fetcher=None):
+        """fetcher is the AsyncReportFetcher used (by default a new one)"""
+        if fetcher is None:
+            fetcher = AsyncReportFetcher()
+        self.fetcher = fetcher
+        self.coalesced = 0
+        self._inflight = {}
+
+    async def fetch(self, StationCode):
+        """
+        Return the parsed WeatherReport for StationCode, joining a fetch
+        of the same station already in progress, if any. Cancelling one
+        caller does not cancel the fetch for the others.
+        """
+        if not StationCode:
+            raise EmptyIDException("No ID given to fetch().")
+        stationid = StationCode.upper()
+        task = self._inflight.get(stationid)
+        if task is None:
+            task = asyncio.ensure_future(
+                self.fetcher.fetch(stationid, parse=True))
+            self._inflight[stationid] = task
+            task.add_done_callback(
+                lambda _: self._inflight.pop(stationid, None))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+
+class ObservationStore:
+
+    """Keeps the history of the observations of many stations on disk.
+       Each station has a directory holding one file per value, an
+       array of fixed-size binary numbers with one entry per report:
+       the observation time as seconds since the epoch, floats (NaN if
+       missing) for the numeric values and codes into the station's list
+       of strings for the texts. Appending only adds to the end of the
+       files, queries for a time range find it by binary search in the
+       memory-mapped times and read just that part of each file.
+       Reports are buffered in memory until Flush() or close()."""
+
+    # Numeric values stored as floats
+    NUMERIC = ("temp", "dewp", "humid", "windspeed", "windgust", "winddir",
+               "press", "vis", "cycle")
+    # Texts stored as codes into the station's strings
+    TEXT = ("weather", "sky", "cloudtype", "pixmap")
+
+    def __init__(self, directory, flushevery=1000):
+        """
+        directory holds the files, it is created if needed. Buffered
+        reports are written once there are flushevery of them.
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.flushevery = flushevery
+        self._pending = {}
+        self._pendingcount = 0
+        # Time of the last report per station
+        self._last = {}
+        # Per station: strings, codes by string and number written
+        self._strings = {}
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Write all buffered reports"""
+        self.Flush()
+
+    def _path(self, station, name):
+        """Return the name of the file of the value name of station"""
+        if not station.isalnum():
+            raise ValueError("Invalid station ID %r" % (station,))
+        return os.path.join(self.directory, station, name)
+
+    def _lastTime(self, station):
+        """Return the time of the last report of station, or None"""
+        if station not in self._last:
+            last = None
+            try:
+                with open(self._path(station, "time"), "rb") as fd:
+                    fd.seek(0, os.SEEK_END)
+                    size = fd.tell() - fd.tell() % 8
+                    if size:
+                        fd.seek(size - 8)
+                        last = array("q", fd.read(8))[0]
+            except FileNotFoundError:
+                size = 0
+            self._truncate(station, size // 8)
+            self._last[station] = last
+        return self._last[station]
+
+    def _truncate(self, station, rows):
+        """
+        Cut the files of station to rows reports, dropping what an
+        interrupted flush wrote past the last complete report, so that
+        appended values stay aligned with their times.
+        """
+        for (name, itemsize) in ([("time", 8)] +
+                                 [(name, 8) for name in self.NUMERIC] +
+                                 [(name, 2) for name in self.TEXT]):
+            try:
+                with open(self._path(station, name), "r+b") as fd:
+                    if os.fstat(fd.fileno()).st_size > rows * itemsize:
+                        fd.truncate(rows * itemsize)
+            except FileNotFoundError:
+                pass
+        # Drop an incomplete last string
+        try:
+            with open(self._path(station, "strings"), "r+b") as fd:
+                content = fd.read()
+                if content and not content.endswith(b"\n"):
+                    fd.truncate(content.rfind(b"\n") + 1)
+        except FileNotFoundError:
+            pass
+
+    def _loadStrings(self, station):
+        """Return the strings of station as (list, dict, number saved)"""
+        if station not in self._strings:
+            strings = []
+            try:
+                with open(self._path(station, "strings"), "rb") as fd:
+                    strings = fd.read().decode("utf-8").split("\n")[:-1]
+            except FileNotFoundError:
+                pass
+            codes = dict((string, code + 1)
+                         for (code, string) in enumerate(strings))
+            self._strings[station] = [strings, codes, len(strings)]
+        return self._strings[station]
+
+    def _code(self, station, value):
+        """Return the code of the text value, 0 for None"""
+        if value is None:
+            return 0
+        (strings, codes, _) = self._loadStrings(station)
+        value = str(value).replace("\n", " ")
+        code = codes.get(value)
+        if code is None:
+            if len(strings) >= 65535:
+                raise ValueError("Too many different texts for %s" %
+                                 station)
+            strings.append(value)
+            code = codes[value] = len(strings)
+        return code
+
+    def Append(self, report):
+        """
+        Add the values of the parsed report. Reports not newer than the
+        last one stored for the station are skipped, so that polling the
+        same report again does no harm. Return True if the report was
+        added.
+        """
+        station = report.givenstationid
+        when = metar_to_epoch(report.rtime)
+        if not station or when is None:
+            raise ValueError("Report lacks the station or time")
+        with self._lock:
+            last = self._lastTime(station)
+            if last is not None and when <= last:
+                return False
+            pending = self._pending.get(station)
+            if pending is None:
+                pending = {"time": array("q")}
+                for name in self.NUMERIC:
+                    pending[name] = array("d")
+                for name in self.TEXT:
+                    pending[name] = array("H")
+                self._pending[station] = pending
+            pending["time"].append(when)
+            for name in self.NUMERIC:
+                value = getattr(report, name, None)
+                pending[name].append(_NAN if value is None else value)
+            for name in self.TEXT:
+                pending[name].append(self._code(station,
+                                                getattr(report, name, None)))
+            self._last[station] = when
+            self._pendingcount += 1
+            if self._pendingcount >= self.flushevery:
+                self._flush()
+        return True
+
+    def Flush(self):
+        """Write the buffered reports to disk"""
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        """Write the buffered reports, with the lock held"""
+        for (station, pending) in self._pending.items():
+            os.makedirs(os.path.join(self.directory, station), exist_ok=True)
+            entry = self._loadStrings(station)
+            (strings, _, saved) = entry
+            if saved < len(strings):
+                with open(self._path(station, "strings"), "ab") as fd:
+                    fd.write("".join(string + "\n" for string
+                                     in strings[saved:]).encode("utf-8"))
+                entry[2] = len(strings)
+            # The times go last: they tell which reports are complete
+            for name in self.NUMERIC + self.TEXT + ("time",):
+                with open(self._path(station, name), "ab") as fd:
+                    pending[name].tofile(fd)
+        self._pending = {}
+        self._pendingcount = 0
+
+    def Stations(self):
+        """Return a sorted list of the stations with stored reports"""
+        self.Flush()
+        return sorted(name for name in os.listdir(self.directory)
+                      if os.path.exists(os.path.join(self.directory, name,
+                                                     "time")))
+
+    def Range(self, station, start=None, end=None):
+        """
+        Return the values of the reports of station made from start up
+        to, but not including, end (seconds since the epoch, None for no
+        limit) as a dict with an array per value: "time" holds the
+        observation times, NUMERIC values are floats (NaN if missing) and
+        TEXT values are lists of strings (or None).
+        """
+        self.Flush()
+        result = {"time": array("q")}
+        for name in self.NUMERIC:
+            result[name] = array("d")
+        for name in self.TEXT:
+            result[name] = []
+        try:
+            fd = open(self._path(station, "time"), "rb")
+        except FileNotFoundError:
+            return result
+        with fd:
+            rows = os.fstat(fd.fileno()).st_size // 8
+            if rows == 0:
+                return result
+            with mmap.mmap(fd.fileno(), rows * 8,
+                           access=mmap.ACCESS_READ) as times:
+                with memoryview(times) as view:
+                    with view.cast("q") as times:
+                        lo = 0 if start is None else bisect.bisect_left(
+                            times, start)
+                        hi = rows if end is None else bisect.bisect_left(
+                            times, end)
+                        result["time"].frombytes(times[lo:hi].tobytes())
+        if lo >= hi:
+            return result
+
+        strings = self._loadStrings(station)[0]
+        for name in self.NUMERIC + self.TEXT:
+            values = result[name] if name in self.NUMERIC else array("H")
+            with open(self._path(station, name), "rb") as fd:
+                fd.seek(lo * values.itemsize)
+                values.frombytes(fd.read((hi - lo) * values.itemsize))
+            if name in self.TEXT:
+                result[name] = [strings[code - 1] if code else None
+                                for code in values]
+        return result
@@ -30,7 +30,7 @@ setuptools.setup(
     url="http://www.schwarzvogel.de/software-pymetar.shtml",
     packages=setuptools.find_packages(),
     py_modules=["pymetar"],
-    scripts=["bin/pymetar"],
+    scripts=["bin/pymetar", "bin/pymetar-catalog"],
     classifiers=(
     "Programming Language :: Python :: 3",
     "License :: OSI Approved :: GNU General Public License v2 or later (GPLv2+)", 
@@ -0,0 +1,69 @@
+#!/usr/bin/python3 -tt
+
+import pymetar
+import sys
+import os
+import time
+import tracemalloc
+
+FIELDS = ("Temperature", "Pressure (altimeter)")
+
+
+def measure(reports, fields):
+    """
+    Return the time per report and the average of the peak memory
+    allocated while parsing a report, not counting the parsed report.
+    """
+    rf=pymetar.ReportFetcher()
+    rp=pymetar.ReportParser(fields=fields)
+    # Best of a few runs, to be less affected by other processes
+    elapsed = None
+    for run in range(5):
+        start = time.perf_counter()
+        for station, report in reports:
+            try:
+                rp.ParseReport(rf.MakeReport(station, report))
+            except pymetar.GarbledReportException:
+                pass
+        run = time.perf_counter() - start
+        if elapsed is None or run < elapsed:
+            elapsed = run
+
+    transient = 0
+    tracemalloc.start()
+    for station, report in reports:
+        repo = rf.MakeReport(station, report)
+        tracemalloc.reset_peak()
+        (before, _) = tracemalloc.get_traced_memory()
+        try:
+            rp.ParseReport(repo)
+        except pymetar.GarbledReportException:
+            pass
+        (after, peak) = tracemalloc.get_traced_memory()
+        transient += peak - after
+    tracemalloc.stop()
+    return (elapsed / len(reports) * 1e6, transient / len(reports))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        repdir=sys.argv[1]
+    else:
+        repdir=("reports")
+
+    reports = []
+    for reportfile in sorted(os.listdir(repdir)):
+        fd = open("%s/%s" % (repdir, reportfile), "rb")
+        reports.append((reportfile[:-4], fd.read()))
+        fd.close()
+
+    default = pymetar.ReportParser.FIND_HEADERS_MAX
+    for name, fields in (("all fields", None), ("%s" % (FIELDS,), FIELDS)):
+        for path, findmax in (("split into lines", 0),
+                              ("headers found in place",
+                               len(pymetar._HEADER_HANDLERS))):
+            pymetar.ReportParser.FIND_HEADERS_MAX = findmax
+            (us, transient) = measure(reports, fields)
+            print("%s, %s: %.1f us/report, %d bytes/report transient" %
+                  (name, path, us, transient))
+    pymetar.ReportParser.FIND_HEADERS_MAX = default
@@ -0,0 +1,48 @@
+#!/usr/bin/python3 -tt
+
+import pymetar
+import sys
+import os
+import tracemalloc
+
+
+def measure(reports, convert):
+    """Return the number of bytes allocated per parsed, converted report"""
+    rf=pymetar.ReportFetcher()
+    rp=pymetar.ReportParser()
+    kept = []
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for station, report in reports:
+        repo = rf.MakeReport(station, report.encode("latin-1"))
+        try:
+            rp.ParseReport(repo)
+        except pymetar.GarbledReportException:
+            continue
+        kept.append(convert(repo))
+    rp.Report = rf.report = rf.fullreport = None
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (after - before) / len(kept)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        repdir=sys.argv[1]
+    else:
+        repdir=("reports")
+
+    reports = []
+    for reportfile in sorted(os.listdir(repdir)):
+        fd = open("%s/%s" % (repdir, reportfile), "rb")
+        # Kept as str, so that every report gets new bytes when measured
+        reports.append((reportfile[:-4], fd.read().decode("latin-1")))
+        fd.close()
+
+    for name, convert in (
+            ("WeatherReport", lambda r: r),
+            ("CompactWeatherReport, keepraw",
+             lambda r: pymetar.CompactWeatherReport.FromReport(r, True)),
+            ("CompactWeatherReport",
+             pymetar.CompactWeatherReport.FromReport)):
+        print("%s: %d bytes/report" % (name, measure(reports, convert)))
@@ -0,0 +1,41 @@
+#!/usr/bin/python3 -tt
+
+import pymetar
+import sys
+import os
+import time
+
+FIELDS = ("Temperature", "Pressure (altimeter)")
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        repdir=sys.argv[1]
+    else:
+        repdir=("reports")
+
+    reports = []
+    for reportfile in sorted(os.listdir(repdir)):
+        fd = open("%s/%s" % (repdir, reportfile), "rb")
+        reports.append((reportfile[:-4], fd.read()))
+        fd.close()
+
+    rf=pymetar.ReportFetcher()
+
+    for name, fields, lazy in (("all fields", None, False),
+                               ("%s" % (FIELDS,), FIELDS, False),
+                               ("lazy, temperature and pressure", None, True)):
+        rp = pymetar.ReportParser(fields=fields, lazy=lazy)
+        count=0
+        start = time.perf_counter()
+        for station, report in reports:
+            repo = rf.MakeReport(station, report)
+            try:
+                rp.ParseReport(repo)
+            except pymetar.GarbledReportException:
+                continue
+            repo.getTemperatureCelsius()
+            repo.getPressure()
+            count += 1
+        elapsed = time.perf_counter() - start
+        print("%s: %s reports in %.3fs, %.1f us/report" %
+              (name, count, elapsed, elapsed / count * 1e6))
@@ -1,6 +1,8 @@
 #!/bin/bash
 
-TESTS="testall.py testpixmap.py testcloud.py testskycond.py"
+TESTS="testall.py testpixmap.py testcloud.py testskycond.py testparsemany.py testiterreports.py testobservationstore.py testlazy.py"
+# Tests that do not need reports
+SELFTESTS="testconditions.py testrawparser.py testpollscheduler.py testfollowcycle.py testasyncfetch.py"
 SETDIR="reports/"
 SETS="set-2007-10-14  set-2010-01-17 set-2010-10-31 set-2017-07-29"
 
@@ -16,3 +18,11 @@ for TEST in $TESTS; do
 		fi
 	done
 done
+for TEST in $SELFTESTS; do
+	echo "Running $TEST"
+	python3 $TEST > logs/$TEST-py3.log
+	if [ $? != 0 ]; then
+		echo "$TEST failed" >&2
+		echo "See logs/$TEST-py3.log for details"
+	fi
+done
@@ -0,0 +1,139 @@
+#!/usr/bin/python3 -tt
+
+import pymetar
+import sys
+import asyncio
+
+REPORT = b"""Duesseldorf, Germany (EDDL) 51-18N 006-46E 41M
+Jul 29, 2017 - 03:50 AM EDT / 2017.07.29 0750 UTC
+Wind: from the SW (220 degrees) at 18 MPH (16 KT):0
+Visibility: greater than 7 mile(s):0
+Sky conditions: mostly cloudy
+Temperature: 68 F (20 C)
+Dew Point: 57 F (14 C)
+Relative Humidity: 68%
+Pressure (altimeter): 29.88 in. Hg (1012 hPa)
+ob: EDDL 290750Z 22016KT 9999 FEW030 BKN055 20/14 Q1012 NOSIG
+cycle: 8
+"""
+
+
+class StandIn:
+
+    """
+    An HTTP/1.1 server standing in for the NOAA site. Reports are sent
+    with a Content-Length, except for CHNK (chunked encoding) and CLOS
+    (Connection: close). After sending DROP, the server drops the
+    connection without telling, as an idle timeout does.
+    """
+
+    def __init__(self):
+        self.connections = 0
+        self.requests = 0
+
+    async def handle(self, reader, writer):
+        self.connections += 1
+        try:
+            while True:
+                request = await reader.readline()
+                if not request:
+                    return
+                while (await reader.readline()) not in (b"\r\n", b""):
+                    pass
+                self.requests += 1
+                station = request.split()[1].rsplit(b"/", 1)[-1][:-4]
+                if station not in (b"EDDL", b"CHNK", b"CLOS", b"DROP"):
+                    writer.write(b"HTTP/1.1 404 Not Found\r\n"
+                                 b"Content-Length: 0\r\n\r\n")
+                elif station == b"CHNK":
+                    writer.write(b"HTTP/1.1 200 OK\r\n"
+                                 b"Transfer-Encoding: chunked\r\n\r\n")
+                    for start in range(0, len(REPORT), 100):
+                        chunk = REPORT[start:start + 100]
+                        writer.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+                    writer.write(b"0\r\n\r\n")
+                else:
+                    close = b""
+                    if station == b"CLOS":
+                        close = b"Connection: close\r\n"
+                    writer.write(b"HTTP/1.1 200 OK\r\n%s"
+                                 b"Content-Length: %d\r\n\r\n%s" %
+                                 (close, len(REPORT), REPORT))
+                await writer.drain()
+                if station in (b"CLOS", b"DROP"):
+                    return
+        finally:
+            writer.close()
+
+
+def check(what, got, expected):
+    if got != expected:
+        print("%s: %r, expected %r" % (what, got, expected))
+        sys.exit(-1)
+
+
+async def fetch_all(fetcher, stations):
+    results = []
+    async for (station, result) in fetcher.fetch_many(stations):
+        results.append((station, result))
+    return results
+
+
+async def main():
+    standin = StandIn()
+    server = await asyncio.start_server(standin.handle, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    fetcher = pymetar.AsyncReportFetcher(
+        "http://127.0.0.1:%d/decoded/" % port, concurrency=1, timeout=10)
+    count=0
+
+    # Chunked encoding
+    report = await fetcher.fetch("chnk")
+    check("chunked body", report.fullreport, REPORT)
+    check("chunked station", report.givenstationid, "CHNK")
+    count += 1
+
+    # Keep-alive: one connection for consecutive requests, whatever
+    # the framing of the responses
+    standin.connections = 0
+    results = await fetch_all(fetcher, ["EDDL", "CHNK", "EDDL"])
+    for (station, result) in results:
+        check("keep-alive %s" % station, result.getTemperatureCelsius(), 20.0)
+    check("keep-alive connections", standin.connections, 1)
+    count += 1
+
+    # Connection: close makes the client open a new connection
+    standin.connections = 0
+    results = await fetch_all(fetcher, ["CLOS", "EDDL", "EDDL"])
+    check("close results", [result.getTemperatureCelsius()
+                            for (station, result) in results],
+          [20.0, 20.0, 20.0])
+    check("close connections", standin.connections, 2)
+    count += 1
+
+    # A connection dropped by the server is reopened and the request
+    # made again
+    standin.connections = 0
+    standin.requests = 0
+    results = await fetch_all(fetcher, ["DROP", "EDDL"])
+    check("reconnect results", [result.getTemperatureCelsius()
+                                for (station, result) in results],
+          [20.0, 20.0])
+    check("reconnect connections", standin.connections, 2)
+    check("reconnect requests", standin.requests, 2)
+    count += 1
+
+    # Errors are returned per station
+    results = dict(await fetch_all(fetcher, ["NONE", "EDDL"]))
+    check("404", isinstance(results["NONE"], pymetar.NetworkException), True)
+    check("after 404", results["EDDL"].getTemperatureCelsius(), 20.0)
+    count += 1
+
+    server.close()
+    await server.wait_closed()
+    return count
+
+
+if __name__ == "__main__":
+    count = asyncio.run(main())
+    sys.stderr.write("%s async fetches check out ok\n" % (count))
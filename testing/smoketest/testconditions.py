@@ -0,0 +1,61 @@
+#!/usr/bin/python3 -tt
+
+import pymetar
+import sys
+import re
+import string
+
+
+def old_condition(wcond):
+    """The lookup extractSkyConditions() did per group before _CONDITIONS"""
+    if len(wcond) > 3 and wcond.startswith(('+', '-')):
+        wcond = wcond[1:]
+
+    if wcond.startswith(('+', '-')):
+        pphen = 1
+    elif len(wcond) < 4:
+        pphen = 0
+    else:
+        pphen = 2
+    squal = wcond[:pphen]
+    sphen = wcond[pphen: pphen + 4]
+    phenomenon = pymetar._WEATHER_CONDITIONS.get(sphen, None)
+    if phenomenon is not None:
+        (name, pixmap, phenomenon) = phenomenon
+        pheninfo = phenomenon.get(squal, name)
+        if not isinstance(pheninfo, type(())):
+            return (pheninfo, pixmap)
+        else:
+            # contains pixmap info
+            return pheninfo
+
+
+if __name__ == "__main__":
+    # Every group of an optional intensity, an optional two letter
+    # qualifier and a two letter phenomenon (which may have a "+")
+    # that COND_RE_STR accepts
+    condre = re.compile(pymetar.COND_RE_STR)
+    pairs = [a + b for a in string.ascii_uppercase
+             for b in string.ascii_uppercase]
+    count=0
+    accepted = set()
+    for intensity in ("", "-", "+"):
+        for qualifier in [""] + pairs:
+            for phenomenon in pairs + ["+" + pair for pair in pairs]:
+                group = intensity + qualifier + phenomenon
+                if not condre.match(group):
+                    continue
+                accepted.add(group)
+                if pymetar._CONDITIONS.get(group) != old_condition(group):
+                    print("%s: %r != %r" % (group,
+                                            pymetar._CONDITIONS.get(group),
+                                            old_condition(group)))
+                    sys.exit(-1)
+                count += 1
+
+    extra = set(pymetar._CONDITIONS) - accepted
+    if extra:
+        print("Groups COND_RE_STR does not accept: %s" % sorted(extra))
+        sys.exit(-1)
+
+    sys.stderr.write("%s weather groups check out ok\n" % (count))
@@ -0,0 +1,115 @@
+#!/usr/bin/python3 -tt
+
+import pymetar
+import sys
+import os
+import threading
+import http.server
+
+
+class CycleServer(http.server.BaseHTTPRequestHandler):
+
+    """Serves the cycle file 08Z.TXT, honouring Range if told to"""
+
+    content = b""
+    honourrange = True
+    ranges = []
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        data = CycleServer.content
+        if not self.path.endswith("/08Z.TXT"):
+            self.send_error(404)
+            return
+        rng = self.headers.get("Range")
+        CycleServer.ranges.append(rng)
+        if rng and CycleServer.honourrange:
+            start = int(rng.split("=")[1].rstrip("-"))
+            if start >= len(data):
+                self.send_response(416)
+                self.send_header("Content-Range", "bytes */%d" % len(data))
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header("Content-Range", "bytes %d-%d/%d" %
+                             (start, len(data) - 1, len(data)))
+            data = data[start:]
+        else:
+            self.send_response(200)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def entry(station, minute):
+    return (b"2017/07/29 08:%02d\n%s 2908%02dZ 22016KT 9999 FEW030 20/14 "
+            b"Q1012\n\n" % (minute, station, minute))
+
+
+def follow(reader, what, expected, rng):
+    del CycleServer.ranges[:]
+    got = [report.givenstationid for report in reader.FollowCycle(8)]
+    if got != expected:
+        print("%s: got %r, expected %r" % (what, got, expected))
+        sys.exit(-1)
+    if CycleServer.ranges != [rng]:
+        print("%s: requested %r, expected %r" %
+              (what, CycleServer.ranges, [rng]))
+        sys.exit(-1)
+
+
+if __name__ == "__main__":
+    os.environ["no_proxy"] = "127.0.0.1"
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), CycleServer)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    reader = pymetar.CycleFileReader("http://127.0.0.1:%d/cycles/" %
+                                     server.server_address[1])
+    count=0
+
+    # First read: whole file, the incomplete last entry is left for later
+    first = entry(b"EDDL", 0) + entry(b"EHAM", 5)
+    third = entry(b"KBOS", 10)
+    CycleServer.content = first + third[:20]
+    follow(reader, "200", ["EDDL", "EHAM"], None)
+    count += 1
+
+    # 206: only the new part is fetched
+    CycleServer.content = first + third + entry(b"LFPG", 15)
+    follow(reader, "206", ["KBOS", "LFPG"], "bytes=%d-" % len(first))
+    seen = len(CycleServer.content)
+    count += 1
+
+    # 416: nothing new
+    follow(reader, "416", [], "bytes=%d-" % seen)
+    count += 1
+
+    # Range ignored: the whole file comes back, the seen part is skipped
+    CycleServer.honourrange = False
+    CycleServer.content += entry(b"RJTT", 20)
+    follow(reader, "Range ignored", ["RJTT"], "bytes=%d-" % seen)
+    seen = len(CycleServer.content)
+    count += 1
+
+    # The file shrank, 416 with a smaller size: read from the start
+    CycleServer.honourrange = True
+    CycleServer.content = entry(b"YSSY", 25) + entry(b"NZAA", 30)
+    del CycleServer.ranges[:]
+    got = [report.givenstationid for report in reader.FollowCycle(8)]
+    if (got != ["YSSY", "NZAA"] or
+            CycleServer.ranges != ["bytes=%d-" % seen, None]):
+        print("416 shrunk: got %r with %r" % (got, CycleServer.ranges))
+        sys.exit(-1)
+    seen = len(CycleServer.content)
+    count += 1
+
+    # The file shrank and Range is ignored: the whole file is new
+    CycleServer.honourrange = False
+    CycleServer.content = entry(b"ZBAA", 1)
+    follow(reader, "200 shrunk", ["ZBAA"], "bytes=%d-" % seen)
+    count += 1
+
+    server.shutdown()
+    sys.stderr.write("%s cycle file reads check out ok\n" % (count))
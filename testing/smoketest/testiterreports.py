@@ -0,0 +1,86 @@
+#!/usr/bin/python3 -tt
+
+import pymetar
+import sys
+import os
+import io
+import shutil
+import tempfile
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        repdir=sys.argv[1]
+    else:
+        repdir=("reports")
+
+    if len(sys.argv) > 2:
+        reports = sys.argv[2:]
+    else:
+        reports = os.listdir(repdir)
+    reports.sort()
+
+    count=0
+    for reportfile in reports:
+        path = "%s/%s" % (repdir, reportfile)
+        fd = open(path, "rb")
+        content = fd.read()
+        fd.close()
+
+        named = list(pymetar.iter_reports(path))
+        # A nameless stream takes the station from the station line
+        nameless = list(pymetar.iter_reports(io.BytesIO(content)))
+        first = content.split(b"\n", 1)[0].decode("latin-1")
+        if "(%s)" % reportfile[:-4] not in first:
+            if nameless:
+                print("%s: report without station ID was not skipped"
+                      % (reportfile))
+                sys.exit(-1)
+            continue
+        if len(named) != len(nameless):
+            print("%s: %s reports named, %s nameless"
+                  % (reportfile, len(named), len(nameless)))
+            sys.exit(-1)
+        for a, b in zip(named, nameless):
+            if (a.givenstationid != b.givenstationid
+                    or a.getTemperatureCelsius() != b.getTemperatureCelsius()
+                    or a.getISOTime() != b.getISOTime()):
+                print("%s: nameless stream parsed differently" % (reportfile))
+                sys.exit(-1)
+        count += 1
+
+    try:
+        list(pymetar.iter_reports(io.BytesIO(b"no station here\n"),
+                                  strict=True))
+    except pymetar.GarbledReportException:
+        pass
+    else:
+        print("Nameless report without station ID was accepted")
+        sys.exit(-1)
+
+    # Archives are often nested directories: all levels are read, in
+    # sorted order
+    directory = tempfile.mkdtemp()
+    try:
+        expected = []
+        for (index, reportfile) in enumerate(reports[:60]):
+            subdir = os.path.join(directory, "%s" % (index % 3),
+                                  "%s" % (index % 2))
+            if index % 5 == 0:
+                subdir = directory
+            os.makedirs(subdir, exist_ok=True)
+            shutil.copy("%s/%s" % (repdir, reportfile), subdir)
+        for (subdir, subdirs, names) in sorted(os.walk(directory)):
+            for name in sorted(names):
+                expected.extend(report.givenstationid for report in
+                                pymetar.iter_reports(os.path.join(subdir,
+                                                                  name)))
+        got = [report.givenstationid
+               for report in pymetar.iter_reports(directory)]
+        if not expected or got != expected:
+            print("Nested directories: got %r, expected %r" %
+                  (got, expected))
+            sys.exit(-1)
+    finally:
+        shutil.rmtree(directory)
+
+    sys.stderr.write("%s station reports check out ok\n" % (count))
@@ -0,0 +1,59 @@
+#!/usr/bin/python3 -tt
+
+import pymetar
+import sys
+import os
+import copy
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        repdir=sys.argv[1]
+    else:
+        repdir=("reports")
+
+    if len(sys.argv) > 2:
+        reports = sys.argv[2:]
+    else:
+        reports = os.listdir(repdir)
+    reports.sort()
+
+    count=0
+    rf=pymetar.ReportFetcher()
+    seen = []
+    lazy = pymetar.ReportParser(fields=("Temperature",), lazy=True)
+    # A handler for a header pymetar does not know runs even though
+    # only some fields are parsed
+    lazy.RegisterHandler("Heat index",
+                         lambda report, data: seen.append(data))
+
+    for reportfile in reports:
+        station = reportfile[:-4]
+        fd = open("%s/%s" % (repdir, reportfile), "rb")
+        report = fd.read()
+        fd.close()
+
+        try:
+            eager = pymetar.ReportParser().ParseReport(
+                rf.MakeReport(station, report))
+        except (pymetar.GarbledReportException, ValueError, IndexError):
+            continue
+        del seen[:]
+        pr = lazy.ParseReport(rf.MakeReport(station, report))
+        # A copy parses its values on its own
+        clone = copy.copy(pr)
+        if pr.getTemperatureCelsius() != eager.getTemperatureCelsius():
+            print("%s: lazy temperature %r != %r" %
+                  (station, pr.getTemperatureCelsius(),
+                   eager.getTemperatureCelsius()))
+            sys.exit(-1)
+        if clone.getTemperatureCelsius() != eager.getTemperatureCelsius():
+            print("%s: copied temperature %r != %r" %
+                  (station, clone.getTemperatureCelsius(),
+                   eager.getTemperatureCelsius()))
+            sys.exit(-1)
+        if (b"\nHeat index:" in report) != bool(seen):
+            print("%s: handler for Heat index was not called" % (station))
+            sys.exit(-1)
+        count += 1
+
+    sys.stderr.write("%s station reports check out ok\n" % (count))
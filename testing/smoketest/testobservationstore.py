@@ -0,0 +1,91 @@
+#!/usr/bin/python3 -tt
+
+import pymetar
+import sys
+import os
+import math
+import array
+import shutil
+import tempfile
+
+
+def report(station, rtime, temp):
+    rep = pymetar.WeatherReport(station)
+    rep.rtime = rtime
+    rep.temp = temp
+    rep.weather = "rain"
+    return rep
+
+
+def same(a, b):
+    return a == b or (a is None and b is None) or (
+        isinstance(a, float) and isinstance(b, float) and
+        math.isnan(a) and math.isnan(b))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        repdir=sys.argv[1]
+    else:
+        repdir=("reports")
+
+    directory = tempfile.mkdtemp()
+    try:
+        # Every parsed report can be stored and read back
+        store = pymetar.ObservationStore(os.path.join(directory, "all"),
+                                         flushevery=500)
+        stored = {}
+        for rep in pymetar.iter_reports(repdir):
+            if rep.givenstationid and rep.rtime and store.Append(rep):
+                stored[rep.givenstationid] = rep
+        store.close()
+        store = pymetar.ObservationStore(os.path.join(directory, "all"))
+        if store.Stations() != sorted(stored):
+            print("Stations differ")
+            sys.exit(-1)
+        count=0
+        for (station, rep) in sorted(stored.items()):
+            values = store.Range(station)
+            if list(values["time"]) != [pymetar.metar_to_epoch(rep.rtime)]:
+                print("%s: times differ" % (station))
+                sys.exit(-1)
+            for name in store.NUMERIC:
+                expected = getattr(rep, name, None)
+                if expected is None:
+                    expected = float("nan")
+                if not same(values[name][0], expected):
+                    print("%s: %s is %r, not %r" %
+                          (station, name, values[name][0], expected))
+                    sys.exit(-1)
+            for name in store.TEXT:
+                expected = getattr(rep, name, None)
+                if expected is not None:
+                    expected = str(expected).replace("\n", " ")
+                if values[name][0] != expected:
+                    print("%s: %s is %r, not %r" %
+                          (station, name, values[name][0], expected))
+                    sys.exit(-1)
+            count += 1
+
+        # A flush interrupted after writing some values but not the time
+        # must not shift the values of the following reports
+        path = os.path.join(directory, "part")
+        with pymetar.ObservationStore(path) as store:
+            store.Append(report("EDDL", "2017.07.29 0750 UTC", 1.0))
+        with open(os.path.join(path, "EDDL", "temp"), "ab") as fd:
+            fd.write(array.array("d", [99.0]).tobytes())
+        with open(os.path.join(path, "EDDL", "strings"), "ab") as fd:
+            fd.write(b"half a str")
+        with pymetar.ObservationStore(path) as store:
+            store.Append(report("EDDL", "2017.07.29 0820 UTC", 2.0))
+            values = store.Range("EDDL")
+        if list(values["temp"]) != [1.0, 2.0]:
+            print("Interrupted flush: temp is %r" % (list(values["temp"]),))
+            sys.exit(-1)
+        if values["weather"] != ["rain", "rain"]:
+            print("Interrupted flush: weather is %r" % (values["weather"],))
+            sys.exit(-1)
+    finally:
+        shutil.rmtree(directory)
+
+    sys.stderr.write("%s station reports check out ok\n" % (count))
@@ -0,0 +1,52 @@
+#!/usr/bin/python3 -tt
+
+import pymetar
+import sys
+import os
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        repdir=sys.argv[1]
+    else:
+        repdir=("reports")
+
+    if len(sys.argv) > 2:
+        reports = sys.argv[2:]
+    else:
+        reports = os.listdir(repdir)
+    reports.sort()
+
+    pairs = []
+    for reportfile in reports:
+        fd = open("%s/%s" % (repdir, reportfile), "rb")
+        pairs.append((reportfile[:-4], fd.read()))
+        fd.close()
+
+    # Bare report contents: the station comes from the first line
+    named = list(pymetar.parse_many(pairs, processes=2))
+    bare = list(pymetar.parse_many([report for (station, report) in pairs],
+                                   processes=2))
+    count=0
+    for (station, report), a, b in zip(pairs, named, bare):
+        first = report.split(b"\n", 1)[0].decode("latin-1")
+        if "(%s)" % station not in first:
+            # No station ID to take: must be flagged as garbled
+            if not isinstance(b, pymetar.GarbledReportException):
+                print("%s: %r is not garbled" % (station, b))
+                sys.exit(-1)
+            continue
+        if isinstance(a, tuple) != isinstance(b, tuple):
+            print("%s: %r != %r" % (station, a, b))
+            sys.exit(-1)
+        if isinstance(a, tuple) and a[1:] != b[1:]:
+            print("%s: values differ for bare contents" % (station))
+            sys.exit(-1)
+        count += 1
+
+    # Contents without a station line are garbled, not fatal
+    result = list(pymetar.parse_many([b"no station here\n"], processes=1))
+    if not isinstance(result[0], pymetar.GarbledReportException):
+        print("Report without station: %r" % (result[0],))
+        sys.exit(-1)
+
+    sys.stderr.write("%s station reports check out ok\n" % (count))
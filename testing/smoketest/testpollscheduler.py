@@ -0,0 +1,115 @@
+#!/usr/bin/python3 -tt
+
+import pymetar
+import sys
+import time
+import calendar
+
+
+class FakeClock:
+
+    """A clock that only moves when told to"""
+
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def at(hour, minute):
+    """Seconds since the epoch of hour:minute on the test day"""
+    return calendar.timegm((2017, 7, 29, hour, minute, 0))
+
+
+def report(station, when):
+    rep = pymetar.WeatherReport(station)
+    rep.rtime = time.strftime("%Y.%m.%d %H%M UTC", time.gmtime(when))
+    return rep
+
+
+def check(what, got, expected):
+    if got != expected:
+        print("%s: %r, expected %r" % (what, got, expected))
+        sys.exit(-1)
+
+
+def observe(scheduler, clock, station, times):
+    """Fetch the reports made at times, delay seconds after each one"""
+    for when in times:
+        clock.now = when + scheduler.delay
+        scheduler.AddStation(station, clock.now)
+        check("%s due" % station, station in scheduler.DueStations(), True)
+        following = scheduler.Update(report(station, when))
+    return following
+
+
+if __name__ == "__main__":
+    count=0
+    clock = FakeClock(at(0, 0))
+    scheduler = pymetar.PollScheduler(delay=300, interval=3600, retry=300,
+                                      clock=clock)
+
+    # Until the cadence is known the station is polled every interval
+    nxt = observe(scheduler, clock, "XXXX", [at(0, 20)])
+    check("unknown cadence", nxt, at(1, 25))
+    check("unknown cadence", scheduler.GetCadence("XXXX"), None)
+    count += 1
+
+    # Hourly reports at :50
+    nxt = observe(scheduler, clock, "EDDL",
+                  [at(0, 50), at(1, 50), at(2, 50)])
+    check("hourly cadence", scheduler.GetCadence("EDDL"), (3600, 3000))
+    check("hourly next", nxt, at(3, 55))
+    count += 1
+
+    # Half-hourly reports at :20 and :50
+    nxt = observe(scheduler, clock, "EHAM",
+                  [at(1, 20), at(1, 50), at(2, 20), at(2, 50)])
+    check("half-hourly cadence", scheduler.GetCadence("EHAM"), (1800, 1200))
+    check("half-hourly next", nxt, at(3, 25))
+    count += 1
+
+    # 3-hourly reports on the hour
+    nxt = observe(scheduler, clock, "FQMA",
+                  [at(0, 0), at(3, 0), at(6, 0)])
+    check("3-hourly cadence", scheduler.GetCadence("FQMA"), (10800, 0))
+    check("3-hourly next", nxt, at(9, 5))
+    count += 1
+
+    # An off-schedule SPECI neither changes the cadence nor delays the
+    # next routine report
+    nxt = observe(scheduler, clock, "KBOS",
+                  [at(0, 50), at(1, 50), at(2, 13)])
+    check("after SPECI next", nxt, at(2, 55))
+    nxt = observe(scheduler, clock, "KBOS", [at(2, 50)])
+    check("SPECI cadence", scheduler.GetCadence("KBOS"), (3600, 3000))
+    check("after SPECI routine next", nxt, at(3, 55))
+    count += 1
+
+    # The hourly report is late: retry with backoff
+    clock.now = at(3, 55)
+    check("due at expected time", "KBOS" in scheduler.DueStations(), True)
+    for backoff in (300, 600, 1200):
+        nxt = scheduler.Update(report("KBOS", at(2, 50)))
+        check("late backoff", nxt, clock.now + backoff)
+        check("time to next", scheduler.TimeToNext() <= backoff, True)
+        check("not due yet", "KBOS" in scheduler.DueStations(), False)
+        clock.now = nxt
+        check("due after backoff", "KBOS" in scheduler.DueStations(), True)
+    # Once it shows up, the schedule is back to normal
+    nxt = scheduler.Update(report("KBOS", at(3, 50)))
+    check("after late report", nxt, at(4, 55))
+    count += 1
+
+    # Failed fetches back off the same way, up to interval
+    clock.now = at(4, 55)
+    check("due", "KBOS" in scheduler.DueStations(), True)
+    for backoff in (300, 600, 1200, 2400, 3600, 3600):
+        nxt = scheduler.Failed("KBOS")
+        check("failure backoff", nxt, clock.now + backoff)
+        clock.now = nxt
+        check("due after failure", "KBOS" in scheduler.DueStations(), True)
+    count += 1
+
+    sys.stderr.write("%s schedules check out ok\n" % (count))
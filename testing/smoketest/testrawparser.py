@@ -0,0 +1,57 @@
+#!/usr/bin/python3 -tt
+
+import pymetar
+import sys
+
+# 2017-07-29 08:00 UTC, gives year and month of the observations
+REFTIME = 1501315200
+
+# Raw METARs and the values RawReportParser has to find in them
+METARS = [
+    ("EDDL 290750Z 22016KT 9999 FEW030 BKN055 20/14 Q1012=",
+     {"getTime": "2017.07.29 0750 UTC", "getCycle": 8,
+      "getWindSpeedKnots": 16.0, "getWindDirection": 220,
+      "getWindGust": None, "getVisibilityKilometers": 10.0,
+      "getTemperatureCelsius": 20.0, "getDewPointCelsius": 14.0,
+      "getHumidity": 68, "getPressure": 1012.0,
+      "getSkyConditions": "mostly cloudy"}),
+    # Gusts, variable direction, whole and fractional statute miles,
+    # vertical visibility, A pressure, T-group after a trend
+    ("METAR KBOS 290754Z 27015G25KT 240V300 1 1/2SM -RA BR VV003 22/12 "
+     "A3012 NOSIG RMK AO2 T02220122",
+     {"getWindSpeedKnots": 15.0, "getWindGust": 12.86,
+      "getWindDirection": 270, "getWindCompass": "W",
+      "getWindDirectionRange": (240, 300), "getVisibilityMiles": 1.5,
+      "getTemperatureCelsius": 22.2, "getDewPointCelsius": 12.2,
+      "getPressure": 1019.98, "getSkyConditions": "obscured"}),
+    # M temperatures, CAVOK, a trend with groups that are not observed
+    ("LFPG 290800Z VRB02KT CAVOK M05/M08 Q1020 BECMG 5000 SCT010",
+     {"getWindSpeedKnots": 2.0, "getWindDirection": None,
+      "getVisibilityKilometers": 10.0, "getTemperatureCelsius": -5.0,
+      "getDewPointCelsius": -8.0, "getPressure": 1020.0,
+      "getSkyConditions": "clear", "getCycle": 8}),
+    # Fraction of a mile, calm, negative T-group
+    ("KJFK 290751Z 00000KT 1/2SM FG OVC002 M01/M02 A2992 RMK T10111022",
+     {"getWindSpeed": 0.0, "getWindDirection": None,
+      "getVisibilityMiles": 0.5, "getTemperatureCelsius": -1.1,
+      "getDewPointCelsius": -2.2, "getPressure": 1013.21,
+      "getSkyConditions": "overcast", "getWeather": "Moderate fog"}),
+]
+
+
+if __name__ == "__main__":
+    count=0
+    for (code, expected) in METARS:
+        report = pymetar.WeatherReport()
+        report.code = code
+        report = pymetar.RawReportParser(reftime=REFTIME).ParseReport(report)
+        for (getter, value) in sorted(expected.items()):
+            got = getattr(report, getter)()
+            if isinstance(got, float):
+                got = round(got, 2)
+            if got != value:
+                print("%s: %s() is %r, not %r" % (code, getter, got, value))
+                sys.exit(-1)
+        count += 1
+
+    sys.stderr.write("%s raw reports check out ok\n" % (count))